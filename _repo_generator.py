@@ -3,10 +3,119 @@
 # Example: zips/plugin.video.dhakaflix/plugin.video.dhakaflix-1.0.0.zip
 
 import os
+import json
+import time
 import shutil
+import zlib
 import hashlib
 import zipfile
+import threading
 import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+
+# Pillow is only needed for the resized artwork variants; without it the
+# original images are shipped as they are
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Fixed entry metadata so the same sources always give a byte-identical zip
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+ZIP_FILE_MODE = 0o644 << 16
+HASH_CHUNK = 1024 * 1024
+
+# Already-compressed formats: deflating them costs CPU and usually makes them
+# slightly bigger, so they are stored as they are
+STORED_EXTS = ('.png', '.jpg', '.jpeg', '.gif', '.webp', '.zip', '.mp3', '.mp4')
+
+# Smaller artwork shipped in place of the originals (file: max width, height).
+# The repository add-on's art is only ever seen in the add-on browser, so a
+# 256px icon and 720p fanart are plenty; the video add-on keeps full size.
+ASSET_VARIANTS = {
+    'repository.tazihad.dhakaflix': {'icon.png': (256, 256), 'fanart.jpg': (1280, 720)},
+}
+ASSET_CACHE = os.path.join("zips", ".assets")
+JPEG_QUALITY = 85
+
+# The repository zip is also published at the repo root, where index.html
+# links it for "Install from zip file"
+REPOSITORY_ID = 'repository.tazihad.dhakaflix'
+
+def hash_file(path, algorithm='sha256'):
+    """Hex digest of a file, read in chunks so large assets are never loaded whole"""
+    digest = hashlib.new(algorithm)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def crc_file(path):
+    """CRC-32 of a file, the checksum zip entries carry"""
+    crc = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+def addon_files(addon_id):
+    """Relative paths of everything that goes into the add-on's zip, in a stable order"""
+    paths = []
+    for root, dirs, files in os.walk(addon_id):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.') and d not in ('__pycache__', '.git', '.github'))
+        for file in sorted(files):
+            if not file.startswith('.') and not file.endswith('.pyc'):
+                paths.append(os.path.relpath(os.path.join(root, file), addon_id))
+    return paths
+
+def compress_type(name):
+    return zipfile.ZIP_STORED if name.lower().endswith(STORED_EXTS) else zipfile.ZIP_DEFLATED
+
+_variant_lock = threading.Lock()
+
+def asset_variant(path, digest, size):
+    """Path of a resized copy of an image, built once per source hash and size"""
+    ext = os.path.splitext(path)[1].lower()
+    out = os.path.join(ASSET_CACHE, f"{digest[:16]}-{size[0]}x{size[1]}{ext}")
+    # Both add-ons ship the same images, so builds running side by side would
+    # otherwise resize the same file twice
+    with _variant_lock:
+        if not os.path.exists(out):
+            os.makedirs(ASSET_CACHE, exist_ok=True)
+            tmp = out + '.tmp'
+            with Image.open(path) as im:
+                im.thumbnail(size, Image.LANCZOS)
+                if ext == '.png':
+                    im.save(tmp, 'PNG', optimize=True)
+                else:
+                    im.convert('RGB').save(tmp, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+            os.replace(tmp, out)
+    # An image already smaller than the target is not worth re-encoding
+    return out if os.path.getsize(out) < os.path.getsize(path) else path
+
+def entry_source(addon_id, name, hashes, variants):
+    """The file that is zipped as name: the source, or its resized variant"""
+    source = os.path.join(addon_id, name)
+    if name in variants:
+        source = asset_variant(source, hashes[name], variants[name])
+    return source
+
+def entry_name(addon_id, name):
+    return os.path.join(addon_id, name).replace(os.sep, '/')
+
+def zip_matches(zip_path, addon_id, files, hashes, variants):
+    """Whether an existing zip holds exactly these files, compared entry by entry"""
+    try:
+        with zipfile.ZipFile(zip_path) as zf:
+            entries = {i.filename: i for i in zf.infolist()}
+    except (OSError, zipfile.BadZipFile):
+        return False
+    if sorted(entries) != sorted(entry_name(addon_id, name) for name in files): return False
+    for name in files:
+        entry = entries[entry_name(addon_id, name)]
+        source = entry_source(addon_id, name, hashes, variants)
+        if entry.file_size != os.path.getsize(source) or entry.CRC != crc_file(source): return False
+    return True
 
 class Generator:
     """
@@ -17,14 +126,38 @@ class Generator:
     def __init__(self):
         # The directory where zipped add-ons and XML index files are stored
         self.ADDONS_DIR = "zips"
+        # Content hashes of what each zip was last built from. It is local
+        # build state, kept out of git; a zip it has no record of (a fresh
+        # checkout, or one pulled from someone else's build) is checked
+        # against the sources entry by entry instead.
+        self.MANIFEST_PATH = os.path.join(self.ADDONS_DIR, ".build_manifest.json")
 
         if not os.path.exists(self.ADDONS_DIR):
             os.makedirs(self.ADDONS_DIR)
 
+        self.manifest = self._load_manifest()
+        self.report = []
+        self.started = time.time()
+
         self._generate_addons_file()
         self._generate_md5_file()
+        self._publish_repository_zip()
+        self._save_manifest()
+        self._print_report()
         print("\nRepository generation finished successfully!")
 
+    def _load_manifest(self):
+        try:
+            with open(self.MANIFEST_PATH, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_manifest(self):
+        with open(self.MANIFEST_PATH, 'w') as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+            f.write('\n')
+
     def _generate_addons_file(self):
         """
         Generates the master addons.xml file from the individual addon.xml files.
@@ -33,6 +166,7 @@ class Generator:
 
         # Start the master XML file structure
         addons_xml = ET.Element('addons')
+        builds = []
 
         # Loop through each folder to find add-ons
         for addon_id in sorted(os.listdir(".")):
@@ -55,15 +189,18 @@ class Generator:
                         if version:
                             # Add the entire <addon> element to the master XML structure
                             addons_xml.append(root)
-
-                            # Create the zip file for the add-on in the NEW nested folder
-                            self._create_zip(addon_id, version)
+                            builds.append((addon_id, version))
                         else:
                             print(f"    WARNING: Skipping {addon_id}. Missing 'version' attribute in addon.xml.")
 
                 except Exception as e:
                     print(f"    ERROR: Excluding {addon_id} due to processing error: {e}")
 
+        # Zips are independent of each other, so they are built side by side;
+        # zlib and hashlib release the GIL, which makes threads enough
+        with ThreadPoolExecutor(max_workers=max(1, min(len(builds), os.cpu_count() or 1))) as ex:
+            self.report = list(ex.map(lambda build: self._create_zip(*build), builds))
+
         # Write the final addons.xml file to the zips directory
         output_xml_path = os.path.join(self.ADDONS_DIR, "addons.xml")
         try:
@@ -87,58 +224,62 @@ class Generator:
 
     def _create_zip(self, addon_id, version):
         """
-        Creates a zip file for the given add-on, placing it in zips/[ADDON ID]/
+        Creates a zip file for the given add-on, placing it in zips/[ADDON ID]/.
+        Returns a report entry:
+        (addon_id, status, file count, payload size, zip size, seconds).
         """
+        start = time.time()
         zip_filename = f"{addon_id}-{version}.zip"
 
-        # --- NEW CODE START ---
-        # Define the path to the NEW nested folder: zips/addon_id/
+        # Define the path to the nested folder: zips/addon_id/
         nested_dir = os.path.join(self.ADDONS_DIR, addon_id)
         if not os.path.exists(nested_dir):
             os.makedirs(nested_dir)
 
         # Define the full zip path: zips/addon_id/addon_id-x.x.x.zip
         zip_path = os.path.join(nested_dir, zip_filename)
-        # --- NEW CODE END ---
-
-        print(f"    Creating {zip_filename} inside {nested_dir}...")
 
-        # Check if the zip already exists and is current (based on timestamp)
-        if os.path.exists(zip_path):
-            zip_time = os.path.getmtime(zip_path)
-            source_time = os.path.getmtime(os.path.join(addon_id, "addon.xml"))
-
-            for root, dirs, files in os.walk(addon_id):
-                for name in files:
-                    source_time = max(source_time, os.path.getmtime(os.path.join(root, name)))
-
-            if source_time < zip_time:
-                print(f"    Skipping: {zip_filename} is up to date.")
-                return
-            else:
-                os.remove(zip_path)
+        files = addon_files(addon_id)
+        hashes = {name: hash_file(os.path.join(addon_id, name)) for name in files}
+        variants = {name: list(size) for name, size in ASSET_VARIANTS.get(addon_id, {}).items()
+                    if name in hashes} if Image else {}
+
+        # The zip is current if it exists and was built from exactly these files
+        previous = self.manifest.get(addon_id, {})
+        current = {'version': version, 'files': hashes, 'variants': variants}
+        if os.path.exists(zip_path) and (
+                (previous.get('version'), previous.get('files'), previous.get('variants', {})) == (version, hashes, variants)
+                or zip_matches(zip_path, addon_id, files, hashes, variants)):
+            self.manifest[addon_id] = current
+            print(f"    Skipping: {zip_filename} is up to date.")
+            with zipfile.ZipFile(zip_path) as zf:
+                payload = sum(i.file_size for i in zf.infolist())
+            return (addon_id, 'up to date', len(files), payload, os.path.getsize(zip_path), time.time() - start)
 
+        print(f"    Creating {zip_filename} inside {nested_dir}...")
+        tmp_path = zip_path + '.tmp'
+        payload = 0
         try:
-            # Create the zip file
-            zf = zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED)
-
-            # Walk through the add-on directory
-            for root, dirs, files in os.walk(addon_id):
-                dirs[:] = [d for d in dirs if not d.startswith('.') and d not in ('__pycache__', '.git', '.github')]
-
-                for file in files:
-                    if not file.startswith('.') and not file.endswith('.pyc'):
-                        full_path = os.path.join(root, file)
-                        archive_name = os.path.join(addon_id, os.path.relpath(full_path, addon_id))
-                        zf.write(full_path, archive_name)
-
-            zf.close()
+            with zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_DEFLATED) as zf:
+                for name in files:
+                    source = entry_source(addon_id, name, hashes, variants)
+                    payload += os.path.getsize(source)
+                    info = zipfile.ZipInfo(entry_name(addon_id, name), ZIP_DATE_TIME)
+                    info.compress_type = compress_type(name)
+                    info.external_attr = ZIP_FILE_MODE
+                    with open(source, 'rb') as src, zf.open(info, 'w') as dst:
+                        for chunk in iter(lambda: src.read(HASH_CHUNK), b''):
+                            dst.write(chunk)
+            os.replace(tmp_path, zip_path)
+            self.manifest[addon_id] = current
             print(f"    {zip_filename} created successfully.")
+            return (addon_id, 'built', len(files), payload, os.path.getsize(zip_path), time.time() - start)
 
         except Exception as e:
             print(f"    ERROR: Failed to create zip for {addon_id}: {e}")
-            if os.path.exists(zip_path):
-                os.remove(zip_path)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return (addon_id, 'failed', len(files), payload, 0, time.time() - start)
 
     def _generate_md5_file(self):
         """
@@ -150,8 +291,7 @@ class Generator:
         md5_path = os.path.join(self.ADDONS_DIR, "addons.xml.md5")
 
         try:
-            with open(addons_xml_path, 'rb') as f:
-                md5_hash = hashlib.md5(f.read()).hexdigest()
+            md5_hash = hash_file(addons_xml_path, 'md5')
 
             with open(md5_path, 'w') as f:
                 f.write(md5_hash)
@@ -161,5 +301,31 @@ class Generator:
         except Exception as e:
             print(f"ERROR: Failed to create md5 hash: {e}")
 
+    def _publish_repository_zip(self):
+        """
+        Copies the built repository zip to the repo root, replacing a copy
+        that would otherwise have to be kept in sync by hand.
+        """
+        for addon_id, status, *_ in self.report:
+            if addon_id != REPOSITORY_ID or status == 'failed': continue
+            version = self.manifest.get(addon_id, {}).get('version')
+            if not version: continue
+            zip_filename = f"{addon_id}-{version}.zip"
+            built = os.path.join(self.ADDONS_DIR, addon_id, zip_filename)
+            if os.path.exists(zip_filename) and hash_file(zip_filename) == hash_file(built): continue
+            shutil.copyfile(built, zip_filename)
+            print(f"{zip_filename} published at the repository root.")
+
+    def _print_report(self):
+        # payload is what Kodi unpacks, zip is what it downloads
+        print("\nBuild report:")
+        print(f"  {'add-on':<32}{'status':<12}{'files':>6}{'payload KB':>12}{'zip KB':>10}{'time s':>9}")
+        for addon_id, status, count, payload, size, seconds in self.report:
+            print(f"  {addon_id:<32}{status:<12}{count:>6}{payload / 1024:>12.1f}{size / 1024:>10.1f}{seconds:>9.2f}")
+        # Add-ons build in parallel, so the total is wall time, not the sum
+        print(f"  {'total':<32}{'':<12}{sum(r[2] for r in self.report):>6}"
+              f"{sum(r[3] for r in self.report) / 1024:>12.1f}"
+              f"{sum(r[4] for r in self.report) / 1024:>10.1f}{time.time() - self.started:>9.2f}")
+
 if __name__ == "__main__":
     Generator()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+"""
+Offline benchmark for the plugin's main paths (router, browse, search, play).
+
+    python benchmarks/bench_plugin.py [--movies N] [--shows N] [--latency MS]
+                                      [--failure-rate P] [--capacity N] [--no-api] [--set KEY=VALUE]
+                                      [--scenario NAME ...] [--json]
+
+Kodi is replaced by the fake_kodi modules and the DHAKA-FLIX servers by
+fake_h5ai instances on localhost, so no Kodi install or ISP LAN is needed.
+Every scenario runs in a freshly loaded plugin module sharing one scratch
+profile, in order, so "warm" scenarios see what the earlier ones cached.
+Reports wall time, requests, bytes and failures seen by the servers, the
+most requests any one server had in flight at once, directory items
+produced and peak Python memory (tracemalloc).
+"""
+
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from importlib import import_module
+from urllib.parse import quote
+
+from plugin_loader import load_plugin
+from fake_h5ai import FakeH5ai, build_tree
+
+import xbmc
+import xbmcaddon
+import xbmcplugin
+
+MOVIE_ROOT = '/DHAKA-FLIX-14/English Movies/'
+SERIES_ROOT = '/DHAKA-FLIX-12/TV-WEB-Series/'
+ARCHIVE_ROOT = '/DHAKA-FLIX-12/TV Series Archive/'
+
+class Bench:
+    def __init__(self, args):
+        self.args = args
+        latency, jitter = args.latency / 1000.0, args.jitter / 1000.0
+        self.movie_server = FakeH5ai(build_tree(MOVIE_ROOT, movies=args.movies), latency, jitter, args.failure_rate,
+                                     not args.no_api, capacity=args.capacity).start()
+        self.series_server = FakeH5ai(build_tree(SERIES_ROOT, shows=args.shows, seasons=args.seasons, episodes=args.episodes),
+                                      latency, jitter, args.failure_rate, not args.no_api, capacity=args.capacity).start()
+        # Same movies on a slower host: search groups the copies, play picks the fast one
+        self.mirror_server = FakeH5ai(build_tree(MOVIE_ROOT, movies=args.movies), args.mirror_latency / 1000.0, jitter,
+                                      args.failure_rate, not args.no_api, capacity=args.capacity).start()
+        # A category too big for API listings below it (see API_MAX_CARRIED), crawled on its own
+        self.archive_server = FakeH5ai(build_tree(ARCHIVE_ROOT, shows=args.archive_shows, seasons=3, episodes=4),
+                                       latency, jitter, args.failure_rate, not args.no_api, capacity=args.capacity).start()
+        self.servers = [self.movie_server, self.series_server, self.mirror_server, self.archive_server]
+        self.profile = tempfile.mkdtemp(prefix='dhakaflix-bench-')
+        xbmcaddon.PROFILE = self.profile
+        xbmcaddon.SETTINGS.update({'track_playback': 'false'})
+        for pair in args.set:
+            key, _, value = pair.partition('=')
+            xbmcaddon.SETTINGS[key] = value
+        xbmc.VERBOSE = args.verbose
+
+    @property
+    def movies_url(self):
+        return self.movie_server.url + quote(MOVIE_ROOT)
+
+    @property
+    def series_url(self):
+        return self.series_server.url + quote(SERIES_ROOT)
+
+    def point(self, plugin):
+        """Aims the plugin's hard-coded server lists at the local stand-ins"""
+        plugin.SEARCH_SERVERS = {
+            'movies': [{'url': self.movie_server.url, 'name': 'DHAKA-FLIX-14'},
+                       {'url': self.mirror_server.url, 'name': 'DHAKA-FLIX-14'}],
+            'series': [{'url': self.series_server.url, 'name': 'DHAKA-FLIX-12'}],
+        }
+        # menus.py draws the category screens, plugin.py crawls them
+        for module in (plugin, sys.modules['resources.lib.menus']):
+            module.MOVIE_CATEGORIES = [('English Movies', self.movies_url)]
+            module.SERIES_CATEGORIES = [('TV & Web Series', self.series_url)]
+
+    @property
+    def archive_url(self):
+        return self.archive_server.url + quote(ARCHIVE_ROOT)
+
+    def crawl_archive(self, plugin):
+        plugin.SERIES_CATEGORIES = [('TV Series Archive', self.archive_url)]
+        plugin.crawl_catalog('series')
+
+    def change_content(self):
+        """One new movie, one new episode and one deleted movie, as between two crawls"""
+        self.movie_server.add_file(f"{MOVIE_ROOT}Brand New Movie (2026) 1080p WEB-DL/", "Brand New Movie (2026) 1080p WEB-DL x264.mkv")
+        self.series_server.add_file(f"{SERIES_ROOT}Show Title 2 (TV Series 2002)/Season 1/", "Show.Title.2.S01E99.720p.WEB-DL.x264.mkv")
+        self.movie_server.remove_folder(f"{MOVIE_ROOT}Movie Title 3 (1993) 1080p BluRay/")
+
+    def invoke(self, name, action):
+        """Runs one plugin invocation; action is a router paramstring or a callable taking the module"""
+        plugin = load_plugin()
+        self.point(plugin)
+        xbmcplugin.reset()
+        for server in self.servers: server.reset_stats()
+
+        if self.args.memory: tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            if callable(action):
+                action(plugin)
+            else:
+                plugin.router(action)
+        finally:
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] if self.args.memory else 0
+            if self.args.memory: tracemalloc.stop()
+            # What the __main__ block does after router()
+            if hasattr(plugin, 'finish_invocation'): plugin.finish_invocation()
+            elif hasattr(plugin, 'save_health'): plugin.save_health()
+
+        return {
+            'scenario': name,
+            'seconds': elapsed,
+            'requests': sum(s.stats['requests'] for s in self.servers),
+            'bytes': sum(s.stats['bytes'] for s in self.servers),
+            'failures': sum(s.stats['failures'] for s in self.servers),
+            'peak_inflight': max(s.stats['peak_inflight'] for s in self.servers),
+            'items': len(xbmcplugin.DIRECTORY),
+            'peak_bytes': peak,
+        }
+
+    def close(self):
+        for server in self.servers: server.stop()
+        shutil.rmtree(self.profile, ignore_errors=True)
+
+def run_service_pass(plugin):
+    """One pass of the background service, as if Kodi had been idle for an hour"""
+    service = import_module('resources.lib.service')
+    service.refresh(service.DhakaFlixService())
+
+def concurrently(n, fn):
+    """Runs fn n times at once, like widgets and a user opening the same thing together"""
+    threads = [threading.Thread(target=fn) for _ in range(n)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+
+def scenarios(bench):
+    first_movie = quote(f"{bench.movies_url}{quote('Movie Title 0 (1990) 1080p BluRay')}/")
+    show = f"{bench.series_url}{quote('Show Title 1 (TV Series 2001)')}/"
+    season = quote(f"{bench.series_url}{quote('Show Title 0 (TV Series 2000)')}/Season%201/")
+    movie_path = f"{quote(MOVIE_ROOT)}{quote('Movie Title 0 (1990) 1080p BluRay')}/{quote('Movie Title 0 (1990) 1080p BluRay x264.mkv')}"
+    movie_file = quote(bench.movie_server.url + movie_path)
+    mirror_file = quote(bench.mirror_server.url + movie_path)
+    episode = lambda e: quote(f"{bench.series_url}{quote('Show Title 0 (TV Series 2000)')}/Season%201/{quote(f'Show.Title.0.S01E{e:02d}.720p.WEB-DL.x264.mkv')}")
+    return [
+        ('menu', ''),
+        ('browse_cold', f"mode=browse&url={quote(bench.movies_url)}"),
+        ('browse_warm', f"mode=browse&url={quote(bench.movies_url)}"),
+        ('browse_page2', f"mode=browse&url={quote(bench.movies_url)}&page=2"),
+        ('browse_child', f"mode=browse&url={first_movie}"),
+        ('browse_season', f"mode=browse&url={season}"),
+        ('browse_show', f"mode=browse&url={quote(show)}"),
+        ('browse_next_season', f"mode=browse&url={quote(show + 'Season%202/')}"),
+        ('browse_together', lambda p: concurrently(4, lambda: p.fetch_links(f"{bench.series_url}{quote('Show Title 4 (TV Series 2004)')}/"))),
+        ('search_together', lambda p: concurrently(3, lambda: p.display_search_results('series', 'Show.Title.4.S01'))),
+        ('search_live', lambda p: p.display_search_results('movies', 'Movie Title 1')),
+        ('search_again', "mode=search&type=movies&query=movie%20title%201"),
+        ('recent_searches', "mode=recent_searches"),
+        ('build_catalog', lambda p: p.build_catalog()),
+        ('search_catalog', lambda p: p.display_search_results('movies', 'Movie Title 2')),
+        ('catalog_update', lambda p: (bench.change_content(), p.build_catalog())),
+        ('recently_added', "mode=recently_added"),
+        ('play', f"mode=play&url={movie_file}&title=Movie&icon="),
+        ('play_mirrors', f"mode=play&url={mirror_file}&mirrors={movie_file}&title=Movie&icon="),
+        ('play_episode', f"mode=play&url={episode(3)}&title=Episode&icon="),
+        ('play_season_end', f"mode=play&url={episode(bench.args.episodes)}&title=Episode&icon="),
+        ('history', "mode=history"),
+        ('download', lambda p: (p.router(f"mode=download&url={movie_file}&mirrors={mirror_file}&title=Movie"),
+                                import_module('resources.lib.downloads').run_queue(lambda: False))),
+        ('play_downloaded', f"mode=play&url={movie_file}&title=Movie&icon="),
+        ('service_refresh', run_service_pass),
+        ('browse_series', f"mode=browse&url={quote(bench.series_url)}"),
+        ('archive_catalog', bench.crawl_archive),
+        ('archive_update', lambda p: (bench.archive_server.add_file(f"{ARCHIVE_ROOT}Show Title 7 (TV Series 2007)/Season 2/",
+                                                                    "Show.Title.7.S02E99.720p.WEB-DL.x264.mkv"),
+                                      bench.crawl_archive(p))),
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--movies', type=int, default=500, help='movie folders on the movie server')
+    parser.add_argument('--shows', type=int, default=50, help='shows on the series server')
+    parser.add_argument('--seasons', type=int, default=3)
+    parser.add_argument('--episodes', type=int, default=12)
+    parser.add_argument('--archive-shows', type=int, default=300, help='shows on the archive server (crawled by the archive_* scenarios)')
+    parser.add_argument('--latency', type=float, default=5, help='per-request server latency in ms')
+    parser.add_argument('--jitter', type=float, default=0, help='random extra latency in ms')
+    parser.add_argument('--mirror-latency', type=float, default=50, help='latency of the slower movie mirror in ms')
+    parser.add_argument('--failure-rate', type=float, default=0, help='fraction of requests answered with 503')
+    parser.add_argument('--capacity', type=int, default=0, help='requests a server handles at once before it slows down (0 = unlimited)')
+    parser.add_argument('--no-api', action='store_true', help='servers without the h5ai JSON API')
+    parser.add_argument('--set', action='append', default=[], metavar='KEY=VALUE', help='addon setting override')
+    parser.add_argument('--scenario', action='append', default=[], help='run only these scenarios (in suite order)')
+    parser.add_argument('--no-memory', dest='memory', action='store_false', help='skip tracemalloc (it slows Python code down)')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    parser.add_argument('-v', '--verbose', action='store_true', help='echo xbmc.log output')
+    args = parser.parse_args()
+
+    bench = Bench(args)
+    results = []
+    try:
+        for name, action in scenarios(bench):
+            if args.scenario and name not in args.scenario: continue
+            results.append(bench.invoke(name, action))
+    finally:
+        bench.close()
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+        return
+
+    print(f"movies={args.movies} shows={args.shows}x{args.seasons}x{args.episodes} latency={args.latency}ms "
+          f"failure_rate={args.failure_rate} capacity={args.capacity or 'unlimited'} api={'off' if args.no_api else 'on'}")
+    print(f"{'scenario':16} {'wall ms':>10} {'requests':>9} {'KB':>9} {'fail':>5} {'conc':>5} {'items':>6} {'peak KB':>9}")
+    for r in results:
+        print(f"{r['scenario']:16} {r['seconds'] * 1000:10.1f} {r['requests']:9d} {r['bytes'] / 1024:9.1f} "
+              f"{r['failures']:5d} {r['peak_inflight']:5d} {r['items']:6d} {r['peak_bytes'] / 1024:9.1f}")
+
+if __name__ == '__main__':
+    main()
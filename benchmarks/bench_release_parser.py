@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+"""
+Benchmarks the release-name parser in plugin.video.dhakaflix/main.py against
+the original substring/regex helpers it replaced.
+
+    python benchmarks/bench_release_parser.py [-v] [-n ROUNDS]
+
+Prints names per second for the legacy functions, the parser without its
+memo (cold) and with it (warm), plus how often title, year and quality agree
+with the legacy output. -v lists every disagreement.
+"""
+
+import argparse
+import os
+import re
+import time
+from urllib.parse import unquote
+
+from plugin_loader import load_plugin
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CORPUS = os.path.join(HERE, 'release_names.txt')
+
+
+# --- LEGACY REFERENCE (main.py before the parser) ---
+
+def legacy_clean_title(filename):
+    try:
+        name = unquote(filename)
+        name = re.sub(r'\.(mkv|mp4|avi|flv|m4v)$', '', name, flags=re.IGNORECASE)
+        name = name.replace('.', ' ').replace('_', ' ').strip()
+        return name
+    except:
+        return filename
+
+def legacy_extract_meta(filename):
+    name = legacy_clean_title(filename)
+    match = re.search(r'\b(19\d{2}|20\d{2})\b', name)
+    year = int(match.group(1)) if match else None
+
+    if year:
+        parts = name.split(str(year))
+        title = parts[0].strip(' ()[]-')
+    else:
+        title = name
+    return title, year
+
+def legacy_extract_quality(filename):
+    fn = filename.lower()
+    quality = 'HD'
+    if '2160p' in fn or '4k' in fn: quality = '4K'
+    elif '1080p' in fn: quality = '1080p'
+    elif '720p' in fn: quality = '720p'
+    elif '480p' in fn: quality = '480p'
+
+    source = ''
+    if 'imax' in fn: source = 'IMAX'
+    elif 'hmax' in fn: source = 'HMAX'
+    elif 'bluray' in fn or 'blu-ray' in fn: source = 'BluRay'
+    elif 'web-dl' in fn or 'webdl' in fn: source = 'WEB-DL'
+    elif 'webrip' in fn: source = 'WEBRip'
+    elif 'hdrip' in fn: source = 'HDRip'
+    elif 'dvdrip' in fn: source = 'DVDRip'
+
+    return f"{quality} {source}".strip()
+
+
+# --- HARNESS ---
+
+def load_corpus():
+    with open(CORPUS, encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+def rate(func, names, rounds, before_round=None):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        if before_round: before_round()
+        for name in names:
+            func(name)
+    return len(names) * rounds / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-n', '--rounds', type=int, default=200)
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args()
+
+    plugin = load_plugin(handle=-1)
+    names = load_corpus()
+
+    def legacy(name):
+        legacy_extract_meta(name)
+        legacy_extract_quality(name)
+
+    def new(name):
+        plugin.extract_meta(name)
+        plugin.extract_quality(name)
+
+    legacy_rate = rate(legacy, names, args.rounds)
+    cold_rate = rate(new, names, args.rounds, before_round=plugin._RELEASE_MEMO.clear)
+    warm_rate = rate(new, names, args.rounds)
+
+    print(f"corpus: {len(names)} names, {args.rounds} rounds")
+    print(f"  legacy       {legacy_rate:12,.0f} names/s")
+    print(f"  parser cold  {cold_rate:12,.0f} names/s  ({cold_rate / legacy_rate:.2f}x)")
+    print(f"  parser warm  {warm_rate:12,.0f} names/s  ({warm_rate / legacy_rate:.2f}x)")
+
+    agree = {'title': 0, 'year': 0, 'quality': 0}
+    diffs = []
+    for name in names:
+        old_title, old_year = legacy_extract_meta(name)
+        old_quality = legacy_extract_quality(name)
+        new_title, new_year = plugin.extract_meta(name)
+        new_quality = plugin.extract_quality(name)
+        for field, old, new_value in (('title', old_title, new_title), ('year', old_year, new_year), ('quality', old_quality, new_quality)):
+            if old == new_value:
+                agree[field] += 1
+            else:
+                diffs.append((name, field, old, new_value))
+
+    print("agreement with legacy:")
+    for field, count in agree.items():
+        print(f"  {field:8} {count}/{len(names)} ({count * 100 // len(names)}%)")
+
+    if args.verbose and diffs:
+        print("differences (legacy -> parser):")
+        for name, field, old, new_value in diffs:
+            print(f"  {name}\n    {field}: {old!r} -> {new_value!r}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+"""
+Cold-start cost of one plugin invocation per mode.
+
+    python benchmarks/bench_startup.py [--runs N] [--mode MODE ...] [--json]
+
+Kodi runs main.py in a new interpreter for every navigation, so each sample
+here is a fresh `python` process: it puts fake_kodi and the addon folder on
+sys.path, runs main.py as __main__ with the mode's paramstring and exits.
+"wall ms" is spawn-to-exit as seen from this process; "script ms" is the
+part spent inside main.py (imports, compile, drawing the directory), which
+is what the addon itself controls. The "baseline" row only imports the fake
+Kodi modules: no invocation can be faster than that.
+
+Only modes that need no server are measured; the profile is a scratch
+directory, so history and stats views render empty.
+"""
+
+import argparse
+import json
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from plugin_loader import ADDON_DIR, FAKE_KODI, MAIN_PY
+
+MODES = [
+    ('baseline', None),
+    ('main_menu', ''),
+    ('movies_root', 'mode=movies_root'),
+    ('series_root', 'mode=series_root'),
+    ('history', 'mode=history'),
+    ('recent_searches', 'mode=recent_searches'),
+    ('diagnostics', 'mode=diagnostics'),
+    ('perf_stats', 'mode=perf_stats'),
+]
+
+BOOTSTRAP = r'''
+import sys, time
+start = time.perf_counter()
+sys.path[:0] = [{fake_kodi!r}, {addon_dir!r}]
+import xbmc, xbmcgui, xbmcplugin, xbmcaddon, xbmcvfs
+xbmcaddon.PROFILE = {profile!r}
+paramstring = {paramstring!r}
+if paramstring is not None:
+    import runpy
+    sys.argv = ['plugin://plugin.video.dhakaflix/', '1', '?' + paramstring]
+    runpy.run_path({main_py!r}, run_name='__main__')
+print((time.perf_counter() - start) * 1000)
+'''
+
+def sample(paramstring, profile):
+    code = BOOTSTRAP.format(fake_kodi=FAKE_KODI, addon_dir=ADDON_DIR, profile=profile,
+                            paramstring=paramstring, main_py=MAIN_PY)
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+    wall = (time.perf_counter() - start) * 1000
+    return wall, float(out.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=15, help='samples per mode (median is reported)')
+    parser.add_argument('--mode', action='append', default=[], help='measure only these modes')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    profile = tempfile.mkdtemp(prefix='dhakaflix-startup-')
+    results = []
+    try:
+        for name, paramstring in MODES:
+            if args.mode and name not in args.mode: continue
+            # First run writes the bytecode caches, as the first navigation in Kodi would
+            sample(paramstring, profile)
+            runs = [sample(paramstring, profile) for _ in range(args.runs)]
+            results.append({
+                'mode': name,
+                'wall_ms': statistics.median(r[0] for r in runs),
+                'script_ms': statistics.median(r[1] for r in runs),
+            })
+    finally:
+        shutil.rmtree(profile, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'mode':<16}{'wall ms':>10}{'script ms':>11}")
+    for r in results:
+        print(f"{r['mode']:<16}{r['wall_ms']:>10.1f}{r['script_ms']:>11.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,273 @@
+"""
+A local stand-in for the DHAKA-FLIX h5ai servers.
+
+Serves h5ai-style HTML directory pages, the JSON API (action "get" with
+"items" or "search") and file bodies with Range support from an in-memory
+tree. Latency and failures can be injected, and every request is counted.
+With a capacity set, the server slows down like a busy one once more than
+that many requests are in flight, and answers 503 past twice that.
+"""
+
+import json
+import random
+import threading
+import time
+from email.utils import formatdate
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import quote, unquote, urlparse
+
+VIDEO_SIZE = 1024 * 1024
+MTIME = 1700000000
+
+def build_tree(root, movies=0, shows=0, seasons=2, episodes=10):
+    """
+    Returns {folder path: [(name, is_dir, size, mtime), ...]} for one server root.
+    Movie folders hold a video, a poster and a subtitle; shows hold seasons of episodes.
+    """
+    tree = {root: []}
+    for i in range(movies):
+        year = 1990 + i % 35
+        folder = f"Movie Title {i} ({year}) 1080p BluRay"
+        tree[root].append((folder, True, None, MTIME + i))
+        path = f"{root}{folder}/"
+        base = f"Movie Title {i} ({year}) 1080p BluRay x264"
+        tree[path] = [
+            (f"{base}.mkv", False, VIDEO_SIZE, MTIME + i),
+            ("poster.jpg", False, 2048, MTIME + i),
+            (f"{base}.en.srt", False, 4096, MTIME + i),
+        ]
+    for i in range(shows):
+        show = f"Show Title {i} (TV Series {2000 + i % 25})"
+        tree[root].append((show, True, None, MTIME + i))
+        show_path = f"{root}{show}/"
+        tree[show_path] = [("poster.jpg", False, 2048, MTIME + i)]
+        for s in range(1, seasons + 1):
+            season = f"Season {s}"
+            tree[show_path].append((season, True, None, MTIME + i))
+            season_path = f"{show_path}{season}/"
+            tree[season_path] = []
+            for e in range(1, episodes + 1):
+                base = f"Show.Title.{i}.S{s:02d}E{e:02d}.720p.WEB-DL.x264"
+                tree[season_path].append((f"{base}.mkv", False, VIDEO_SIZE, MTIME + e))
+                tree[season_path].append((f"{base}.en.srt", False, 4096, MTIME + e))
+    return tree
+
+def split_folder(folder):
+    """'/a/b/' -> ('/a/', 'b')"""
+    parent, _, name = folder.rstrip('/').rpartition('/')
+    return parent + '/', name
+
+PATTERN = bytes(range(251))
+
+def file_bytes(start, end):
+    """Bytes start..end (inclusive) of every fake file: byte i is i % 251"""
+    offset = start % len(PATTERN)
+    length = end - start + 1
+    return (PATTERN * ((offset + length) // len(PATTERN) + 1))[offset:offset + length]
+
+class FakeH5ai:
+    def __init__(self, tree, latency=0.0, jitter=0.0, failure_rate=0.0, api=True, seed=1, capacity=0):
+        self.tree = tree
+        self.files = {}
+        for folder, entries in tree.items():
+            for name, is_dir, size, mtime in entries:
+                if not is_dir: self.files[folder + name] = (size, mtime)
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.api = api
+        self.capacity = capacity
+        self.inflight = 0
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.server = None
+        self.reset_stats()
+
+    def _touch(self, folder):
+        # A folder's mtime (as its parent lists it) moves when its entries change
+        parent, name = split_folder(folder)
+        if parent not in self.tree: return
+        self.tree[parent] = [(n, d, s, int(time.time())) if d and n == name else (n, d, s, m)
+                             for n, d, s, m in self.tree[parent]]
+
+    def add_file(self, folder, name, size=VIDEO_SIZE):
+        """Adds a file, creating its folder if needed, the way new uploads appear"""
+        with self.lock:
+            now = int(time.time())
+            if folder not in self.tree:
+                parent, base = split_folder(folder)
+                self.tree[folder] = []
+                self.tree[parent].append((base, True, None, now))
+                self._touch(parent)
+            self.tree[folder].append((name, False, size, now))
+            self.files[folder + name] = (size, now)
+            self._touch(folder)
+
+    def remove_folder(self, folder):
+        with self.lock:
+            for path in [p for p in self.tree if p.startswith(folder)]: del self.tree[path]
+            for path in [p for p in self.files if p.startswith(folder)]: del self.files[path]
+            parent, base = split_folder(folder)
+            self.tree[parent] = [e for e in self.tree[parent] if not (e[1] and e[0] == base)]
+            self._touch(parent)
+
+    def reset_stats(self):
+        self.stats = {'requests': 0, 'bytes': 0, 'failures': 0, 'not_modified': 0, 'peak_inflight': 0, 'by_kind': {}}
+
+    def count(self, kind, nbytes=0):
+        with self.lock:
+            self.stats['requests'] += 1
+            self.stats['bytes'] += nbytes
+            self.stats['by_kind'][kind] = self.stats['by_kind'].get(kind, 0) + 1
+
+    def should_fail(self):
+        with self.lock:
+            self.inflight += 1
+            self.stats['peak_inflight'] = max(self.stats['peak_inflight'], self.inflight)
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            fail = self.random.random() < self.failure_rate
+            if self.capacity and self.inflight > self.capacity:
+                # Work queues up behind the requests already being served
+                delay *= self.inflight / self.capacity
+                fail = fail or self.inflight > 2 * self.capacity
+            if fail: self.stats['failures'] += 1
+        try:
+            if delay: time.sleep(delay)
+        finally:
+            with self.lock: self.inflight -= 1
+        return fail
+
+    def entries(self, folder):
+        """A folder's entries; folders above the tree's roots hold just the way down"""
+        if folder in self.tree: return self.tree[folder]
+        below = sorted({p[len(folder):].split('/', 1)[0] for p in self.tree if p.startswith(folder) and p != folder})
+        return [(name, True, None, MTIME) for name in below]
+
+    def api_items(self, href, what):
+        """
+        What h5ai's get_items answers: the folder and every folder above it, and
+        with what >= 1 the content of each of them too (not just of href)
+        """
+        chain = ['/']
+        for part in href.strip('/').split('/'):
+            if part: chain.append(chain[-1] + part + '/')
+        items = {}
+        for folder in chain:
+            entries = self.entries(folder)
+            own_mtime = max([e[3] for e in entries] or [MTIME])
+            items[folder] = {'href': quote(folder), 'time': own_mtime * 1000, 'size': None, 'managed': True,
+                             'fetched': bool(what)}
+            if not what: continue
+            for name, is_dir, size, mtime in entries:
+                path = folder + name + ('/' if is_dir else '')
+                items.setdefault(path, {'href': quote(path), 'time': mtime * 1000, 'size': size,
+                                        'managed': is_dir, 'fetched': False})
+        return list(items.values())
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        owner = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def reply(self, status, body=b'', content_type='text/html; charset=utf-8', headers=None, kind='other'):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                if self.command != 'HEAD': self.wfile.write(body)
+                owner.count(kind, len(body))
+
+            def do_GET(self):
+                if owner.should_fail(): return self.reply(503, b'busy', kind='failed')
+                path = unquote(urlparse(self.path).path)
+                if path in owner.tree:
+                    return self.listing(path)
+                if path in owner.files:
+                    return self.file(path)
+                self.reply(404, b'not found', kind='missing')
+
+            do_HEAD = do_GET
+
+            def listing(self, path):
+                entries = owner.tree[path]
+                etag = '"%x-%d"' % (max([e[3] for e in entries] or [MTIME]), len(entries))
+                if self.headers.get('If-None-Match') == etag:
+                    with owner.lock: owner.stats['not_modified'] += 1
+                    return self.reply(304, kind='listing_304')
+                rows = ['<a href="/_h5ai/public/index.php">h5ai</a>', '<a href="..">Parent Directory</a>']
+                for name, is_dir, size, mtime in entries:
+                    href = quote(path + name + ('/' if is_dir else ''))
+                    rows.append(f'<tr><td><a href="{href}">{name}</a></td><td>{size or ""}</td></tr>')
+                body = f"<html><body><table>{''.join(rows)}</table></body></html>".encode('utf-8')
+                self.reply(200, body, headers={'ETag': etag, 'Last-Modified': formatdate(MTIME, usegmt=True)}, kind='listing')
+
+            def file(self, path):
+                size, mtime = owner.files[path]
+                start, end = 0, size - 1
+                status = 200
+                rng = self.headers.get('Range')
+                if rng and rng.startswith('bytes='):
+                    first, _, last = rng[6:].partition('-')
+                    start = int(first or 0)
+                    end = min(int(last), size - 1) if last else size - 1
+                    status = 206
+                # Deterministic content so downloads can be verified
+                body = file_bytes(start, end) if self.command != 'HEAD' else b''
+                headers = {'Accept-Ranges': 'bytes', 'Last-Modified': formatdate(mtime, usegmt=True)}
+                if status == 206: headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+                if self.command == 'HEAD':
+                    self.send_response(200)
+                    self.send_header('Content-Length', str(size))
+                    for key, value in headers.items(): self.send_header(key, value)
+                    self.end_headers()
+                    return owner.count('head')
+                self.reply(status, body, 'video/x-matroska', headers, kind='file')
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                raw = self.rfile.read(length) if length else b''
+                if owner.should_fail(): return self.reply(503, b'busy', kind='failed')
+                if not owner.api: return self.reply(405, b'<html>no api</html>', kind='api_disabled')
+                try:
+                    data = json.loads(raw or b'{}')
+                except ValueError:
+                    return self.reply(400, b'bad json', kind='bad')
+
+                out = {}
+                kind = 'api'
+                if 'items' in data:
+                    kind = 'api_items'
+                    href = unquote(data['items'].get('href', '/'))
+                    if href not in owner.tree: return self.reply(404, b'{}', 'application/json', kind='missing')
+                    out['items'] = owner.api_items(href, data['items'].get('what', 1))
+                if 'search' in data:
+                    kind = 'api_search'
+                    pattern = data['search'].get('pattern', '').lower()
+                    root = unquote(data['search'].get('href', '/'))
+                    out['search'] = [
+                        {'href': quote(path), 'time': mtime * 1000, 'size': size}
+                        for path, (size, mtime) in owner.files.items()
+                        if path.startswith(root) and pattern in path.rsplit('/', 1)[-1].lower()
+                    ]
+                self.reply(200, json.dumps(out).encode('utf-8'), 'application/json', kind=kind)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
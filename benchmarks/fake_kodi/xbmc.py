@@ -0,0 +1,95 @@
+"""Stand-in for Kodi's xbmc module: enough for the plugin to run headless."""
+
+LOGDEBUG, LOGINFO, LOGWARNING, LOGERROR, LOGFATAL = 0, 1, 2, 3, 4
+PLAYLIST_MUSIC, PLAYLIST_VIDEO = 0, 1
+
+LOG = []
+BUILTINS = []
+VERBOSE = False
+KEYBOARD_TEXT = ''
+IDLE_TIME = 3600
+
+def log(msg, level=LOGDEBUG):
+    LOG.append((level, msg))
+    if VERBOSE: print(f"[xbmc] {msg}")
+
+def executebuiltin(command, wait=False):
+    BUILTINS.append(command)
+
+def sleep(ms):
+    pass
+
+def getCondVisibility(condition):
+    return False
+
+def getInfoLabel(label):
+    return ''
+
+def getGlobalIdleTime():
+    return IDLE_TIME
+
+class Keyboard:
+    def __init__(self, default='', heading='', hidden=False):
+        self._text = KEYBOARD_TEXT or default
+
+    def doModal(self, autoclose=0):
+        pass
+
+    def isConfirmed(self):
+        return bool(self._text)
+
+    def getText(self):
+        return self._text
+
+class Monitor:
+    def abortRequested(self):
+        return False
+
+    def waitForAbort(self, timeout=0):
+        return True
+
+class Player:
+    def isPlaying(self):
+        return False
+
+    def isPlayingVideo(self):
+        return False
+
+    def getPlayingFile(self):
+        raise RuntimeError('not playing')
+
+    def getTime(self):
+        raise RuntimeError('not playing')
+
+    def getTotalTime(self):
+        raise RuntimeError('not playing')
+
+    def play(self, item=None, listitem=None, windowed=False, startpos=-1):
+        PLAYED.append((item, startpos))
+
+# Like Kodi's, a playlist outlives the PlayList object that filled it
+PLAYLISTS = {PLAYLIST_MUSIC: [], PLAYLIST_VIDEO: []}
+PLAYED = []
+
+class PlayList:
+    def __init__(self, kind):
+        self.items = PLAYLISTS[kind]
+
+    def clear(self):
+        del self.items[:]
+
+    def add(self, url, listitem=None, index=-1):
+        import xbmcgui
+        listitem = listitem or xbmcgui.ListItem()
+        listitem.setPath(url)
+        if index < 0: self.items.append(listitem)
+        else: self.items.insert(index, listitem)
+
+    def size(self):
+        return len(self.items)
+
+    def getposition(self):
+        return 0
+
+    def __getitem__(self, i):
+        return self.items[i]
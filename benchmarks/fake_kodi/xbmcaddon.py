@@ -0,0 +1,29 @@
+"""Stand-in for Kodi's xbmcaddon module. Point PROFILE at a scratch directory
+and put setting overrides in SETTINGS (values are strings, as in Kodi)."""
+
+import os
+
+ADDON_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'plugin.video.dhakaflix')
+PROFILE = ''
+SETTINGS = {}
+
+class Addon:
+    def __init__(self, id=None):
+        pass
+
+    def getAddonInfo(self, key):
+        return {
+            'id': 'plugin.video.dhakaflix',
+            'name': 'DhakaFlix media',
+            'path': ADDON_PATH,
+            'profile': PROFILE,
+            'icon': os.path.join(ADDON_PATH, 'icon.png'),
+            'fanart': os.path.join(ADDON_PATH, 'fanart.jpg'),
+            'version': '0',
+        }.get(key, '')
+
+    def getSetting(self, key):
+        return SETTINGS.get(key, '')
+
+    def setSetting(self, key, value):
+        SETTINGS[key] = value
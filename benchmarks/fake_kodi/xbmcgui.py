@@ -0,0 +1,84 @@
+"""Stand-in for Kodi's xbmcgui module."""
+
+NOTIFICATION_INFO = 'info'
+NOTIFICATION_WARNING = 'warning'
+NOTIFICATION_ERROR = 'error'
+
+NOTIFICATIONS = []
+
+class ListItem:
+    def __init__(self, label='', label2='', path='', offscreen=False):
+        self.label = label
+        self.label2 = label2
+        self.path = path
+        self.info = {}
+        self.art = {}
+        self.properties = {}
+        self.subtitles = []
+        self.context_menu = []
+
+    def getLabel(self):
+        return self.label
+
+    def setLabel(self, label):
+        self.label = label
+
+    def setLabel2(self, label):
+        self.label2 = label
+
+    def setPath(self, path):
+        self.path = path
+
+    def getPath(self):
+        return self.path
+
+    def setInfo(self, kind, info):
+        self.info.update(info)
+
+    def setArt(self, art):
+        self.art.update(art)
+
+    def setProperty(self, key, value):
+        self.properties[key] = value
+
+    def getProperty(self, key):
+        return self.properties.get(key, '')
+
+    def setSubtitles(self, subtitles):
+        self.subtitles = list(subtitles)
+
+    def addContextMenuItems(self, items, replaceItems=False):
+        self.context_menu.extend(items)
+
+class Dialog:
+    def yesno(self, heading, message, *args, **kwargs):
+        return True
+
+    def ok(self, heading, message):
+        return True
+
+    def notification(self, heading, message, icon='', time=5000, sound=True):
+        NOTIFICATIONS.append(message)
+
+    def select(self, heading, options, *args, **kwargs):
+        return 0 if options else -1
+
+    def textviewer(self, heading, text, usemono=False):
+        pass
+
+class DialogProgress:
+    def create(self, heading, message=''):
+        pass
+
+    def update(self, percent, message=''):
+        pass
+
+    def iscanceled(self):
+        return False
+
+    def close(self):
+        pass
+
+class DialogProgressBG(DialogProgress):
+    def isFinished(self):
+        return False
@@ -0,0 +1,35 @@
+"""Stand-in for Kodi's xbmcplugin module; records what the plugin hands to Kodi."""
+
+SORT_METHOD_NONE, SORT_METHOD_LABEL, SORT_METHOD_DATE, SORT_METHOD_SIZE = 0, 1, 3, 5
+
+DIRECTORY = []
+RESOLVED = []
+ENDED = []
+
+def reset():
+    del DIRECTORY[:]
+    del RESOLVED[:]
+    del ENDED[:]
+
+def addDirectoryItem(handle, url, listitem, isFolder=False, totalItems=0):
+    DIRECTORY.append((url, listitem, isFolder))
+    return True
+
+def addDirectoryItems(handle, items, totalItems=0):
+    DIRECTORY.extend(items)
+    return True
+
+def endOfDirectory(handle, succeeded=True, updateListing=False, cacheToDisc=True):
+    ENDED.append(len(DIRECTORY))
+
+def setResolvedUrl(handle, succeeded, listitem):
+    RESOLVED.append(listitem.path)
+
+def setContent(handle, content):
+    pass
+
+def addSortMethod(handle, sortMethod, labelMask='', label2Mask=''):
+    pass
+
+def setPluginCategory(handle, category):
+    pass
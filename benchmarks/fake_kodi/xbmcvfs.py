@@ -0,0 +1,20 @@
+"""Stand-in for Kodi's xbmcvfs module."""
+
+import os
+
+def translatePath(path):
+    return path
+
+def exists(path):
+    return os.path.exists(path)
+
+def mkdirs(path):
+    os.makedirs(path, exist_ok=True)
+    return True
+
+def delete(path):
+    try:
+        os.remove(path)
+        return True
+    except OSError:
+        return False
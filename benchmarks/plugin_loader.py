@@ -0,0 +1,26 @@
+"""Loads the plugin (resources/lib/plugin.py) outside Kodi, on top of the fake_kodi modules."""
+
+import os
+import sys
+import importlib
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ADDON_DIR = os.path.abspath(os.path.join(HERE, '..', 'plugin.video.dhakaflix'))
+MAIN_PY = os.path.join(ADDON_DIR, 'main.py')
+FAKE_KODI = os.path.join(HERE, 'fake_kodi')
+
+# Kodi puts the addon folder on sys.path, which is what makes resources.lib importable
+for path in (FAKE_KODI, ADDON_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+def load_plugin(handle=1, base_url='plugin://plugin.video.dhakaflix/'):
+    """
+    Imports the plugin modules afresh, the way Kodi starts a new interpreter
+    for every navigation. Module state (sessions, memos) is therefore not
+    shared between calls; anything on disk in the profile is.
+    """
+    sys.argv = [base_url, str(handle), '']
+    for name in [n for n in sys.modules if n == 'resources' or n.startswith('resources.')]:
+        del sys.modules[name]
+    return importlib.import_module('resources.lib.plugin')
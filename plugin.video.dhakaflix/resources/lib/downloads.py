@@ -0,0 +1,420 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+import xbmc
+import xbmcgui
+import xbmcplugin
+import xbmcvfs
+from urllib.parse import quote, unquote, urlparse
+
+from resources.lib import plugin
+from resources.lib.menus import HANDLE, build_url
+
+# Downloads for watching from local disk. The plugin only queues them (the
+# "Download" context menu entry); the background service does the transfer,
+# so a download carries on after leaving the add-on and resumes after Kodi
+# restarts. A file is fetched as PIECE_SIZE ranges over a few parallel
+# connections, spread across the release's mirrors, into a preallocated
+# .part file. Finished pieces (and how far the unfinished ones got) are saved
+# as it goes, so an interrupted download only fetches what is still missing.
+
+PIECE_SIZE = 16 * 1024 * 1024
+READ_CHUNK = 256 * 1024
+SAVE_INTERVAL = 5
+PIECE_RETRIES = 3
+QUEUE_MAX = 20
+NOTIFY_MESSAGE = 'dhakaflix_download'
+
+class DownloadError(Exception):
+    pass
+
+# --- QUEUE ---
+
+def open_downloads():
+    if not os.path.exists(plugin.PROFILE_DIR):
+        os.makedirs(plugin.PROFILE_DIR, exist_ok=True)
+    conn = sqlite3.connect(plugin.DOWNLOADS_DB, timeout=10)
+    conn.execute('PRAGMA journal_mode=WAL')
+    # status: queued, active, done or failed; progress is the JSON piece state of an unfinished download
+    conn.execute('CREATE TABLE IF NOT EXISTS downloads (url TEXT PRIMARY KEY, title TEXT, mirrors TEXT, size INTEGER, '
+                 'path TEXT, status TEXT, received INTEGER DEFAULT 0, progress TEXT, added INTEGER, error TEXT)')
+    return conn
+
+def download_dir():
+    path = plugin.ADDON.getSetting('download_path')
+    return xbmcvfs.translatePath(path) if path else os.path.join(plugin.PROFILE_DIR, 'downloads')
+
+def _target_path(conn, url):
+    name = re.sub(r'[\\/:*?"<>|]', '_', unquote(urlparse(url).path.rstrip('/').split('/')[-1])) or 'video'
+    base, ext = os.path.splitext(name)
+    taken = {row[0] for row in conn.execute('SELECT path FROM downloads')}
+    path = os.path.join(download_dir(), name)
+    n = 1
+    while path in taken or os.path.exists(path):
+        path = os.path.join(download_dir(), f"{base} ({n}){ext}")
+        n += 1
+    return path
+
+def queue_download(params):
+    url = params.get('url')
+    if not url: return
+    mirrors = params.get('mirrors', '')
+    size = int(params['size']) if params.get('size', '').isdigit() else None
+    try:
+        conn = open_downloads()
+        try:
+            row = conn.execute('SELECT status FROM downloads WHERE url = ?', (url,)).fetchone()
+            if row and row[0] != 'failed':
+                message = 'Already downloaded' if row[0] == 'done' else 'Already in the download queue'
+                xbmcgui.Dialog().notification('DhakaFlix', message, xbmcgui.NOTIFICATION_INFO)
+                return
+            pending = conn.execute("SELECT COUNT(*) FROM downloads WHERE status IN ('queued', 'active')").fetchone()[0]
+            if pending >= QUEUE_MAX:
+                xbmcgui.Dialog().notification('DhakaFlix', 'Download queue is full', xbmcgui.NOTIFICATION_WARNING)
+                return
+            with conn:
+                if row:
+                    # Retrying a failed download keeps its .part file and piece state
+                    conn.execute("UPDATE downloads SET status = 'queued', error = NULL, mirrors = COALESCE(NULLIF(?, ''), mirrors), added = ? WHERE url = ?",
+                                 (mirrors, int(time.time()), url))
+                else:
+                    conn.execute("INSERT INTO downloads (url, title, mirrors, size, path, status, added) VALUES (?, ?, ?, ?, ?, 'queued', ?)",
+                                 (url, params.get('title') or '', mirrors, size, _target_path(conn, url), int(time.time())))
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        xbmcgui.Dialog().notification('DhakaFlix', 'Could not queue the download', xbmcgui.NOTIFICATION_ERROR)
+        return
+    # Wakes the service instead of waiting for its next poll
+    xbmc.executebuiltin(f'NotifyAll(plugin.video.dhakaflix,{NOTIFY_MESSAGE})')
+    xbmcgui.Dialog().notification('DhakaFlix', 'Queued for download', xbmcgui.NOTIFICATION_INFO)
+
+def remove_download(url):
+    """Cancels a queued or running download, or deletes a finished one, with its file"""
+    try:
+        conn = open_downloads()
+        try:
+            row = conn.execute('SELECT path FROM downloads WHERE url = ?', (url,)).fetchone()
+            with conn:
+                conn.execute('DELETE FROM downloads WHERE url = ?', (url,))
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return
+    if row:
+        # A running download notices the missing row at its next save and stops
+        for path in (row[0], row[0] + '.part'):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    xbmc.executebuiltin('Container.Refresh')
+
+def local_copy(urls):
+    """Path of a finished download of any of urls (the same release on other mirrors counts)"""
+    if not os.path.exists(plugin.DOWNLOADS_DB): return None
+    try:
+        conn = open_downloads()
+        try:
+            for url in urls:
+                row = conn.execute("SELECT path FROM downloads WHERE status = 'done' AND (url = ? OR '|' || mirrors || '|' LIKE ?)",
+                                   (url, f'%|{url}|%')).fetchone()
+                if row and os.path.exists(row[0]): return row[0]
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        pass
+    return None
+
+# --- TRANSFER ---
+
+def _head(url):
+    """(size, supports ranges) of url as the server reports it, or None"""
+    try:
+        r = plugin.http_request('HEAD', url, allow_redirects=True)
+    except:
+        return None
+    if r.status_code != 200 or not r.headers.get('Content-Length'): return None
+    return int(r.headers['Content-Length']), r.headers.get('Accept-Ranges') == 'bytes'
+
+class Download:
+    def __init__(self, url, mirrors, size, path, progress, should_stop):
+        self.url = url
+        self.mirrors = mirrors
+        self.size = size
+        self.path = path
+        self.should_stop = should_stop
+        self.lock = threading.Lock()
+        state = json.loads(progress) if progress else {}
+        self.done = set(state.get('done', []))
+        # piece -> bytes of it already written
+        self.partial = {int(k): v for k, v in state.get('partial', {}).items()}
+        self.piece_size = PIECE_SIZE
+        self.pieces = 0
+        self.next_piece = 0
+        self.error = None
+        self.stopped = False
+
+    def state(self):
+        with self.lock:
+            return json.dumps({'done': sorted(self.done), 'partial': self.partial})
+
+    def received(self):
+        if not self.size: return 0
+        with self.lock:
+            return sum(self._piece_range(i)[1] - self._piece_range(i)[0] + 1 for i in self.done) + sum(self.partial.values())
+
+    def _piece_range(self, i):
+        return i * self.piece_size, min(self.size, (i + 1) * self.piece_size) - 1
+
+    def sources(self):
+        """The url and every mirror that has a file of the expected size"""
+        sources = []
+        mismatch = False
+        for url in [self.url] + self.mirrors:
+            info = _head(url)
+            if not info: continue
+            size, ranges = info
+            if self.size is None: self.size = size
+            # A copy with a different size than listed is a different (or broken) file
+            if size != self.size:
+                mismatch = True
+                continue
+            if not ranges and url == self.url and not sources:
+                # No ranges: the file can only come in one piece from the start
+                return [url], False
+            if ranges: sources.append(url)
+        if not sources: raise DownloadError('Size differs from the listing' if mismatch else 'File not found')
+        return sources, True
+
+    def _take_piece(self):
+        with self.lock:
+            while self.next_piece < self.pieces and self.next_piece in self.done:
+                self.next_piece += 1
+            if self.next_piece >= self.pieces: return None
+            self.next_piece += 1
+            return self.next_piece - 1
+
+    def _fetch_piece(self, i, source, f):
+        start, end = self._piece_range(i)
+        offset = start + self.partial.get(i, 0)
+        headers = {'Range': f'bytes={offset}-{end}'} if self.ranged else {}
+        r = plugin.http_request('GET', source, headers=headers, stream=True)
+        try:
+            if r.status_code != (206 if self.ranged else 200): raise DownloadError(f'HTTP {r.status_code}')
+            # Each answer has to be the bytes asked for, of a file of the listed size;
+            # anything else is a different or changed file on that server
+            if self.ranged:
+                expected = f'bytes {offset}-{end}/{self.size}'
+                if r.headers.get('Content-Range', '').replace(' ', '') != expected.replace(' ', ''):
+                    raise DownloadError('Server sent a different range')
+            elif r.headers.get('Content-Length') not in (None, str(self.size)):
+                raise DownloadError('Size differs from the listing')
+            f.seek(offset)
+            for chunk in r.iter_content(READ_CHUNK):
+                if self.should_stop() or self.stopped: return False
+                chunk = chunk[:end + 1 - offset]
+                f.write(chunk)
+                offset += len(chunk)
+                with self.lock:
+                    self.partial[i] = offset - start
+                if offset > end: break
+        finally:
+            r.close()
+        if offset <= end: raise DownloadError('Connection closed early')
+        with self.lock:
+            self.partial.pop(i, None)
+            self.done.add(i)
+        return True
+
+    def _worker(self, n):
+        with plugin.request_lane(plugin.LANE_BACKGROUND), open(self.path + '.part', 'r+b') as f:
+            while not self.stopped and not self.should_stop():
+                i = self._take_piece()
+                if i is None: return
+                for attempt in range(PIECE_RETRIES):
+                    # Workers start on different mirrors and move on to the next one after a failure
+                    source = self.sources_list[(n + attempt) % len(self.sources_list)]
+                    try:
+                        if not self._fetch_piece(i, source, f): return
+                        break
+                    except Exception as e:
+                        if attempt == PIECE_RETRIES - 1:
+                            self.error = str(e) or type(e).__name__
+                            self.stopped = True
+                            return
+                        time.sleep(2 ** attempt)
+
+    def run(self, connections, use_mirrors, on_save):
+        """Transfers what is missing; True when the file is complete. on_save(self) returning False cancels."""
+        self.mirrors = self.mirrors if use_mirrors else []
+        self.sources_list, self.ranged = self.sources()
+        if not self.ranged:
+            # Nothing to resume from: the whole file is one piece, fetched from the start
+            self.done, self.partial = set(), {}
+            self.piece_size = max(1, self.size)
+        self.pieces = max(1, (self.size + self.piece_size - 1) // self.piece_size)
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        part = self.path + '.part'
+        # Preallocated, so pieces can be written at their offsets in any order
+        with open(part, 'ab') as f:
+            if f.tell() != self.size: f.truncate(self.size)
+
+        workers = [threading.Thread(target=self._worker, args=(n,), daemon=True)
+                   for n in range(max(1, min(connections, self.pieces)))]
+        for w in workers: w.start()
+        last_save = time.time()
+        while any(w.is_alive() for w in workers):
+            for w in workers: w.join(0.5)
+            if time.time() - last_save >= SAVE_INTERVAL:
+                last_save = time.time()
+                if not on_save(self): self.stopped = True
+        for w in workers: w.join()
+
+        if self.error: raise DownloadError(self.error)
+        # Every piece is complete only once all of its bytes arrived, from answers
+        # checked against the listed size (see _fetch_piece)
+        if len(self.done) < self.pieces: return False
+        os.replace(part, self.path)
+        return True
+
+def run_download(row, should_stop):
+    """Runs one queued download to completion, failure or cancellation"""
+    url, title, mirrors, size, path, progress = row
+    mirrors = [m for m in (mirrors or '').split('|') if m]
+    download = Download(url, mirrors, size, path, progress, should_stop)
+
+    def save(d):
+        try:
+            conn = open_downloads()
+            try:
+                with conn:
+                    cur = conn.execute('UPDATE downloads SET received = ?, progress = ?, size = ? WHERE url = ?',
+                                       (d.received(), d.state(), d.size, url))
+                # Removed from the Downloads list: stop
+                return cur.rowcount > 0
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            return True
+
+    status, error = 'queued', None
+    try:
+        if download.run(plugin.get_setting_int('download_connections', 4),
+                        plugin.get_setting_bool('download_mirrors', True), save):
+            status = 'done'
+    except Exception as e:
+        status, error = 'failed', str(e) or type(e).__name__
+    try:
+        conn = open_downloads()
+        try:
+            with conn:
+                cur = conn.execute('UPDATE downloads SET status = ?, error = ?, received = ?, progress = ?, size = ? WHERE url = ?',
+                                   (status, error, download.received(), None if status == 'done' else download.state(), download.size, url))
+        finally:
+            conn.close()
+        if not cur.rowcount:
+            # Removed while running; the file could not be deleted while it was open
+            for leftover in (path, path + '.part'):
+                if os.path.exists(leftover): os.remove(leftover)
+            return 'removed'
+    except (sqlite3.Error, OSError):
+        pass
+    if status == 'done':
+        xbmcgui.Dialog().notification('DhakaFlix', f'Downloaded {title}', xbmcgui.NOTIFICATION_INFO)
+    elif status == 'failed':
+        xbmc.log(f"DhakaFlix: download of {url} failed: {error}", xbmc.LOGWARNING)
+        xbmcgui.Dialog().notification('DhakaFlix', f'Download failed: {title}', xbmcgui.NOTIFICATION_WARNING)
+    return status
+
+def next_queued():
+    try:
+        conn = open_downloads()
+        try:
+            with conn:
+                row = conn.execute("SELECT url, title, mirrors, size, path, progress FROM downloads WHERE status = 'queued' "
+                                   "ORDER BY added LIMIT 1").fetchone()
+                if row: conn.execute("UPDATE downloads SET status = 'active' WHERE url = ?", (row[0],))
+            return row
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return None
+
+def reset_active():
+    """Downloads cut off by a shutdown go back to the queue (service start)"""
+    if not os.path.exists(plugin.DOWNLOADS_DB): return
+    try:
+        conn = open_downloads()
+        try:
+            with conn:
+                conn.execute("UPDATE downloads SET status = 'queued' WHERE status = 'active'")
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        pass
+
+def run_queue(should_stop, parallel=1):
+    """Works through the queue, parallel downloads at a time, until it is empty or should_stop()"""
+    if not os.path.exists(plugin.DOWNLOADS_DB): return
+    running = []
+    while not should_stop():
+        running = [t for t in running if t.is_alive()]
+        row = next_queued() if len(running) < parallel else None
+        if row:
+            t = threading.Thread(target=run_download, args=(row, should_stop), daemon=True)
+            t.start()
+            running.append(t)
+            continue
+        if not running: return
+        running[0].join(1)
+    for t in running: t.join()
+
+# --- MENU ---
+
+def downloads_menu():
+    rows = []
+    if os.path.exists(plugin.DOWNLOADS_DB):
+        try:
+            conn = open_downloads()
+            try:
+                rows = conn.execute('SELECT url, title, size, path, status, received, error FROM downloads ORDER BY added DESC').fetchall()
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            pass
+    if not rows:
+        li = xbmcgui.ListItem("No Downloads")
+        xbmcplugin.addDirectoryItem(HANDLE, "", li, isFolder=False)
+
+    for url, title, size, path, status, received, error in rows:
+        title = title or os.path.basename(path)
+        remove = ('Remove download', f'RunPlugin({build_url(f"mode=download_remove&url={quote(url)}")})')
+        if status == 'done':
+            li = xbmcgui.ListItem(title)
+            li.setInfo('video', {'title': title, 'mediatype': 'video', 'size': size or 0})
+            li.setArt({'icon': 'DefaultVideo.png'})
+            li.setProperty('IsPlayable', 'true')
+            li.addContextMenuItems([remove])
+            # Played through mode=play so history and resume points work as for the online copy
+            play = f"mode=play&url={quote(url)}&title={quote(title)}&icon=DefaultVideo.png"
+            xbmcplugin.addDirectoryItem(HANDLE, build_url(play), li, isFolder=False)
+            continue
+
+        if status == 'failed':
+            state = f"[COLOR red]failed: {error}[/COLOR]"
+        else:
+            percent = f"{int(received * 100 / size)}%" if size else f"{(received or 0) // (1024 * 1024)} MB"
+            state = f"[COLOR yellow]{percent}[/COLOR]" + (" downloading" if status == 'active' else " queued")
+        li = xbmcgui.ListItem(f"{title} {state}")
+        li.setArt({'icon': 'DefaultIconInfo.png'})
+        menu = [remove]
+        if status == 'failed':
+            menu.insert(0, ('Retry download', f'RunPlugin({build_url(f"mode=download&url={quote(url)}")})'))
+        li.addContextMenuItems(menu)
+        xbmcplugin.addDirectoryItem(HANDLE, "", li, isFolder=False)
+    xbmcplugin.endOfDirectory(HANDLE, cacheToDisc=False)
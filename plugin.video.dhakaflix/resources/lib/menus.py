@@ -0,0 +1,87 @@
+import sys
+import xbmcgui
+import xbmcplugin
+import xbmcaddon
+from urllib.parse import quote
+
+# Everything here is static data, so main.py can draw these screens without
+# importing plugin.py (and with it requests, the parser tables, ...).
+
+# --- CONFIGURATION ---
+try:
+    HANDLE = int(sys.argv[1])
+except:
+    HANDLE = -1
+
+BASE_URL = sys.argv[0]
+ADDON = xbmcaddon.Addon()
+
+# --- BROWSE CATEGORIES ---
+MOVIE_CATEGORIES = [
+    ('English Movies - 720p', 'http://172.16.50.7/DHAKA-FLIX-7/English%20Movies/'),
+    ('English Movies - 1080p', 'http://172.16.50.14/DHAKA-FLIX-14/English%20Movies%20%281080p%29/'),
+    ('Hindi Movies', 'http://172.16.50.14/DHAKA-FLIX-14/Hindi%20Movies/'),
+    ('South Indian Movies', 'http://172.16.50.14/DHAKA-FLIX-14/SOUTH%20INDIAN%20MOVIES/South%20Movies/'),
+    ('South Indian Hindi Dubbed', 'http://172.16.50.14/DHAKA-FLIX-14/SOUTH%20INDIAN%20MOVIES/Hindi%20Dubbed/'),
+    ('West Bengal Bangla Movies', 'http://172.16.50.7/DHAKA-FLIX-7/Kolkata%20Bangla%20Movies/'),
+    ('Animation Movies', 'http://172.16.50.14/DHAKA-FLIX-14/Animation%20Movies/'),
+    ('Animation Movies - 1080p', 'http://172.16.50.14/DHAKA-FLIX-14/Animation%20Movies%20%281080p%29/'),
+    ('Foreign Language Movies', 'http://172.16.50.7/DHAKA-FLIX-7/Foreign%20Language%20Movies/'),
+    ('IMDB Top-250 Movies', 'http://172.16.50.14/DHAKA-FLIX-14/IMDb%20Top-250%20Movies/')
+]
+
+SERIES_CATEGORIES = [
+    ('TV & Web Series', 'http://172.16.50.12/DHAKA-FLIX-12/TV-WEB-Series/'),
+    ('Korean TV & Web Series', 'http://172.16.50.14/DHAKA-FLIX-14/KOREAN%20TV%20%26%20WEB%20Series/'),
+    ('Anime & Cartoon Series', 'http://172.16.50.9/DHAKA-FLIX-9/Anime%20%26%20Cartoon%20TV%20Series/'),
+    ('Documentary', 'http://172.16.50.9/DHAKA-FLIX-9/Documentary/'),
+    ('WWE & AEW Wrestling', 'http://172.16.50.9/DHAKA-FLIX-9/WWE%20%26%20AEW%20Wrestling/'),
+    ('Award & TV Shows', 'http://172.16.50.9/DHAKA-FLIX-9/Awards%20%26%20TV%20Shows/')
+]
+
+MAIN_MENU = [
+    ("Movies", "movies_root"),
+    ("TV Series", "series_root"),
+    ("Recently Added", "recently_added"),
+    ("Search Movies", "search_input&type=movies"),
+    ("Search TV Series", "search_input&type=series"),
+    ("Recent Searches", "recent_searches"),
+    ("Recently Played", "history"),
+    ("Downloads", "downloads"),
+    ("Server Status", "diagnostics")
+]
+
+# --- KODI MENUS ---
+
+def build_url(query):
+    return BASE_URL + '?' + query
+
+def main_menu():
+    icon = ADDON.getAddonInfo('icon')
+    fanart = ADDON.getAddonInfo('fanart')
+
+    for name, mode in MAIN_MENU:
+        li = xbmcgui.ListItem(name)
+        li.setArt({'icon': icon, 'thumb': icon, 'fanart': fanart})
+        xbmcplugin.addDirectoryItem(HANDLE, build_url(f"mode={mode}"), li, isFolder=True)
+
+    xbmcplugin.endOfDirectory(HANDLE)
+
+def category_menu(categories):
+    for title, link in categories:
+        li = xbmcgui.ListItem(title)
+        url = build_url(f"mode=browse&url={quote(link)}")
+        xbmcplugin.addDirectoryItem(HANDLE, url, li, isFolder=True)
+    xbmcplugin.endOfDirectory(HANDLE)
+
+def movies_menu():
+    category_menu(MOVIE_CATEGORIES)
+
+def series_menu():
+    category_menu(SERIES_CATEGORIES)
+
+STATIC_MODES = {
+    None: main_menu,
+    'movies_root': movies_menu,
+    'series_root': series_menu
+}
@@ -0,0 +1,2562 @@
+import re
+import xbmc
+import xbmcgui
+import xbmcplugin
+import xbmcaddon
+import xbmcvfs 
+import os
+import json
+import sqlite3
+import time
+import hashlib
+import bisect
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from urllib.parse import parse_qsl, quote, unquote, urlparse, urljoin
+
+# requests (~150 ms to import), concurrent.futures and socket are imported in
+# the functions that use them, so views that never touch the network don't pay
+# for them on every navigation.
+
+from resources.lib.menus import (HANDLE, BASE_URL, ADDON, MOVIE_CATEGORIES, SERIES_CATEGORIES,
+                                 build_url, main_menu, movies_menu, series_menu)
+
+# --- CONFIGURATION ---
+# Worker threads per batch of requests; how many of them are actually talking
+# to a server at once is up to the request scheduler
+MAX_THREADS = 20
+
+# --- HISTORY CONFIGURATION ---
+# We use xbmcvfs.translatePath for Kodi 19+ compatibility
+PROFILE_DIR = xbmcvfs.translatePath(ADDON.getAddonInfo('profile'))
+HISTORY_FILE = os.path.join(PROFILE_DIR, 'history.json')
+HISTORY_DB = os.path.join(PROFILE_DIR, 'history.db')
+
+# --- CACHE CONFIGURATION ---
+CACHE_DIR = os.path.join(PROFILE_DIR, 'cache')
+LISTING_CACHE_DIR = os.path.join(CACHE_DIR, 'listings')
+ART_CACHE_FILE = os.path.join(CACHE_DIR, 'folder_art.json')
+ART_CACHE_MAX_ENTRIES = 20000
+CATALOG_DB = os.path.join(PROFILE_DIR, 'catalog.db')
+DOWNLOADS_DB = os.path.join(PROFILE_DIR, 'downloads.db')
+HEALTH_FILE = os.path.join(PROFILE_DIR, 'server_health.json')
+PERF_FILE = os.path.join(PROFILE_DIR, 'perf_stats.jsonl')
+PERF_MAX_RECORDS = 500
+MAX_CRAWL_DEPTH = 5
+CATALOG_CHANGES_KEEP = 2000
+
+# --- SEARCH CONFIGURATION ---
+SEARCH_SERVERS = {
+    'movies': [
+        {'url': 'http://172.16.50.14', 'name': 'DHAKA-FLIX-14'},
+        {'url': 'http://172.16.50.7',  'name': 'DHAKA-FLIX-7'}
+    ],
+    'series': [
+        {'url': 'http://172.16.50.12', 'name': 'DHAKA-FLIX-12'},
+        {'url': 'http://172.16.50.14', 'name': 'DHAKA-FLIX-14'},
+        {'url': 'http://172.16.50.9',  'name': 'DHAKA-FLIX-9'}
+    ]
+}
+
+# --- HELPER FUNCTIONS ---
+
+YEAR_RE = re.compile(r'\b(19\d{2}|20\d{2})\b')
+
+def get_setting_int(key, default):
+    try:
+        return int(ADDON.getSetting(key))
+    except:
+        return default
+
+def get_setting_bool(key, default):
+    value = ADDON.getSetting(key)
+    if not value: return default
+    return value == 'true'
+
+def write_json_atomic(path, data):
+    # Write to a temp file first so a concurrent reader never sees half a file
+    folder = os.path.dirname(path)
+    if not os.path.exists(folder):
+        os.makedirs(folder, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+VIDEO_EXT_RE = re.compile(r'\.(mkv|mp4|avi|flv|m4v)$', re.IGNORECASE)
+
+def clean_title(filename):
+    try:
+        name = unquote(filename)
+        name = VIDEO_EXT_RE.sub('', name)
+        name = name.replace('.', ' ').replace('_', ' ').strip()
+        return name
+    except:
+        return filename
+
+# --- RELEASE NAME PARSER ---
+# A few precompiled scans over the lower-cased name (tags, years, the episode
+# tag) instead of a Python loop per token; results are memoized (and stored
+# with the offline catalog) since the same names are parsed again on every
+# browse and search.
+
+RELEASE_TOKENS = {
+    '2160p': ('resolution', '2160p'), '4k': ('resolution', '2160p'), 'uhd': ('resolution', '2160p'),
+    '1080p': ('resolution', '1080p'), '1080i': ('resolution', '1080p'),
+    '720p': ('resolution', '720p'), '576p': ('resolution', '576p'), '480p': ('resolution', '480p'),
+    'imax': ('source', 'IMAX'), 'hmax': ('source', 'HMAX'),
+    'bluray': ('source', 'BluRay'), 'blu-ray': ('source', 'BluRay'), 'bdrip': ('source', 'BluRay'), 'brrip': ('source', 'BluRay'),
+    'web-dl': ('source', 'WEB-DL'), 'webdl': ('source', 'WEB-DL'), 'webrip': ('source', 'WEBRip'), 'web-rip': ('source', 'WEBRip'),
+    'hdrip': ('source', 'HDRip'), 'dvdrip': ('source', 'DVDRip'), 'hdtv': ('source', 'HDTV'),
+    'x264': ('codec', 'x264'), 'h264': ('codec', 'x264'), 'avc': ('codec', 'x264'),
+    'x265': ('codec', 'x265'), 'h265': ('codec', 'x265'), 'hevc': ('codec', 'x265'),
+    'av1': ('codec', 'AV1'), 'xvid': ('codec', 'XviD'),
+    'hdr': ('hdr', 'HDR'), 'hdr10': ('hdr', 'HDR10'), 'hdr10+': ('hdr', 'HDR10+'), 'hdr10plus': ('hdr', 'HDR10+'),
+    'dv': ('hdr', 'DV'), 'dovi': ('hdr', 'DV'),
+}
+RELEASE_SPLIT_RE = re.compile(r'[\s._\[\](){}]+')
+# Everything the parser looks for, in one scan: a tag, an audio tag, a year or
+# an episode tag, standing alone between separators (a dash may follow:
+# x264-GROUP). Longer tags come first, so hdr10+ wins over hdr. Matching the
+# separator itself, rather than looking behind for it, lets the regex engine
+# skip straight from one separator to the next.
+RELEASE_SCAN_RE = re.compile(
+    r'[\s._\[\](){}-](?:(' + '|'.join(re.escape(t) for t in sorted(RELEASE_TOKENS, key=len, reverse=True)) + r')'
+    r'|(aac|e?ac3|ddp?|dts(?:-?hd)?|truehd|atmos|flac|mp3|opus)\d*'
+    r'|(19\d{2}|20\d{2})'
+    r'|s(\d{1,2})e(\d{1,3})|(\d{1,2})x(\d{2,3}))(?![a-z0-9+])')
+VIDEO_EXTS = ('.mkv', '.mp4', '.avi', '.flv', '.m4v')
+# Lower wins when a name carries several sources (IMAX BluRay -> IMAX)
+SOURCE_RANK = {s: i for i, s in enumerate(['IMAX', 'HMAX', 'BluRay', 'WEB-DL', 'WEBRip', 'HDRip', 'DVDRip', 'HDTV'])}
+RESOLUTION_LABELS = {'2160p': '4K', '1080p': '1080p', '720p': '720p', '480p': '480p'}
+RELEASE_MEMO_SIZE = 5000
+# Stored with parsed metadata (listing cache, catalog); bump it whenever the
+# parser's output changes so what was stored before is parsed again
+PARSER_VERSION = 2
+_RELEASE_MEMO = OrderedDict()
+# Art scans and the service fill the memo from worker threads
+_RELEASE_LOCK = threading.Lock()
+
+def _release_words(text):
+    return RELEASE_SPLIT_RE.sub(' ', text).strip(' -')
+
+def _parse_release(filename):
+    name = unquote(filename) if '%' in filename else filename
+    low = name.lower()
+    if low.endswith(VIDEO_EXTS):
+        name, low = name[:-4], low[:-4]
+    meta = {'title': None, 'year': None, 'resolution': None, 'source': None, 'codec': None,
+            'hdr': None, 'audio': None, 'season': None, 'episode': None, 'show': None}
+
+    tags = []
+    years = []
+    episode_at = None
+    # Scanned with a separator in front, so a match starts where its token
+    # starts in the name
+    for m in RELEASE_SCAN_RE.finditer('.' + low):
+        kind = m.lastindex
+        if kind == 3:
+            # A year that opens the name is part of the title ("2012.2009")
+            if m.start(): years.append((m.start(), int(m.group(3))))
+            continue
+        if kind > 3:
+            if episode_at is None:
+                meta['season'] = int(m.group(4) or m.group(6))
+                meta['episode'] = int(m.group(5) or m.group(7))
+                episode_at = m.start()
+            continue
+        tags.append((m.start(), RELEASE_TOKENS[m.group(1)] if kind == 1 else ('audio', m.group(2).upper())))
+
+    # Tag words ahead of the year belong to the title ("Mr.Hollands.Opus.1995",
+    # "IMAX.Hubble.2010"). The release year is the last year before the first
+    # tag after it, so a year that is part of the title stays in it
+    # ("Blade.Runner.2049.2017.1080p").
+    cut = len(low)
+    if years:
+        first_tag = next((t[0] for t in tags if t[0] > years[0][0]), cut)
+        cut, meta['year'] = [y for y in years if y[0] < first_tag][-1]
+        tags = [t for t in tags if t[0] > cut]
+    elif tags:
+        cut = tags[0][0]
+    for _, (field, value) in tags:
+        if field == 'source':
+            if meta['source'] is None or SOURCE_RANK[value] < SOURCE_RANK[meta['source']]:
+                meta['source'] = value
+        elif meta[field] is None:
+            meta[field] = value
+    meta['title'] = _release_words(name[:cut]) or _release_words(name)
+    if episode_at is not None:
+        meta['show'] = _release_words(name[:min(episode_at, cut)])
+
+    quality = RESOLUTION_LABELS.get(meta['resolution'], 'HD')
+    meta['quality'] = f"{quality} {meta['source'] or ''}".strip()
+    return meta
+
+def parse_release(filename):
+    with _RELEASE_LOCK:
+        meta = _RELEASE_MEMO.get(filename)
+        if meta is not None:
+            _RELEASE_MEMO.move_to_end(filename)
+            return meta
+    meta = _parse_release(filename)
+    remember_release(filename, meta)
+    return meta
+
+def remember_release(filename, meta):
+    """Seeds the memo, e.g. with metadata already stored in the catalog"""
+    with _RELEASE_LOCK:
+        _RELEASE_MEMO[filename] = meta
+        if len(_RELEASE_MEMO) > RELEASE_MEMO_SIZE:
+            _RELEASE_MEMO.popitem(last=False)
+
+def extract_meta(filename):
+    meta = parse_release(filename)
+    return meta['title'], meta['year']
+
+def item_meta(item):
+    """(title, year) of a listing item; cached listings carry them (see save_cached_listing)"""
+    if 'title' in item: return item['title'], item.get('year')
+    return extract_meta(item['label'])
+
+def extract_quality(filename):
+    return parse_release(filename)['quality']
+
+# --- SUBTITLE MATCHING ---
+# Subtitles in a folder are indexed once by normalized name (sorted) and by
+# episode tag, so each video is matched with a bisect instead of a scan.
+
+SUBTITLE_EXTS = ('srt', 'ass', 'sub', 'smi', 'vtt')
+EPISODE_RE = re.compile(r'\b[Ss](\d{1,2})[ ._-]?[Ee](\d{1,3})|\b(\d{1,2})x(\d{2,3})\b')
+# Language words seen after the video's name in subtitle names, as ISO 639-1
+SUB_LANGUAGES = {
+    'en': 'en', 'eng': 'en', 'english': 'en', 'bn': 'bn', 'ben': 'bn', 'bangla': 'bn', 'bengali': 'bn',
+    'hi': 'hi', 'hin': 'hi', 'hindi': 'hi', 'ar': 'ar', 'ara': 'ar', 'arabic': 'ar',
+    'es': 'es', 'spa': 'es', 'spanish': 'es', 'fr': 'fr', 'fre': 'fr', 'fra': 'fr', 'french': 'fr',
+    'de': 'de', 'ger': 'de', 'deu': 'de', 'german': 'de', 'it': 'it', 'ita': 'it', 'italian': 'it',
+    'pt': 'pt', 'por': 'pt', 'portuguese': 'pt', 'ko': 'ko', 'kor': 'ko', 'korean': 'ko',
+    'ja': 'ja', 'jpn': 'ja', 'japanese': 'ja', 'zh': 'zh', 'chi': 'zh', 'chs': 'zh', 'cht': 'zh', 'chinese': 'zh'
+}
+
+def _normalize_name(name):
+    return ' '.join(re.findall(r'[a-z0-9]+', name.lower()))
+
+def episode_tag(name):
+    """(season, episode) from S01E02 / 1x02 style names, or None"""
+    match = EPISODE_RE.search(name)
+    if not match: return None
+    season, episode = (match.group(1), match.group(2)) if match.group(1) else (match.group(3), match.group(4))
+    return int(season), int(episode)
+
+def subtitle_language(tail):
+    """ISO 639-1 code from the words after the video's name ('en us', 'english sdh', 'por'), or None"""
+    for word in tail.split():
+        if word in SUB_LANGUAGES: return SUB_LANGUAGES[word]
+    return None
+
+def build_subtitle_index(sub_items):
+    named = sorted((_normalize_name(os.path.splitext(unquote(s['label']))[0]), s['url']) for s in sub_items)
+    index = {'names': [n for n, _ in named], 'urls': [u for _, u in named], 'by_episode': {},
+             'all': [s['url'] for s in sub_items]}
+    for sub in sub_items:
+        tag = episode_tag(unquote(sub['label']))
+        if tag: index['by_episode'].setdefault(tag, []).append(sub['url'])
+    return index
+
+def match_subtitles(index, video_label):
+    # Any subtitle named like the video plus more words (Movie.en-US.srt,
+    # Movie_English.srt). ' ' sorts before letters and digits, so they all
+    # follow the video's own name in the index.
+    base = _normalize_name(os.path.splitext(unquote(video_label))[0])
+    names = index['names']
+    matches = []
+    i = bisect.bisect_left(names, base)
+    while i < len(names) and (names[i] == base or names[i].startswith(base + ' ')):
+        matches.append((names[i][len(base) + 1:], index['urls'][i]))
+        i += 1
+    if matches:
+        # English (or unmarked) first, then the other languages
+        matches.sort(key=lambda m: subtitle_language(m[0]) not in (None, 'en'))
+        return [url for _, url in matches]
+    tag = episode_tag(base)
+    if tag: return index['by_episode'].get(tag, [])
+    # A lone subtitle next to a single movie belongs to it
+    if len(index['all']) == 1: return index['all']
+    return []
+
+# --- HISTORY FUNCTIONS ---
+# Watch history and resume points live in SQLite: a play is a single upsert
+# instead of rewriting the whole file, and concurrent plays cannot lose entries.
+
+def open_history():
+    if not os.path.exists(PROFILE_DIR):
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+    conn = sqlite3.connect(HISTORY_DB, timeout=10)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('CREATE TABLE IF NOT EXISTS history (url TEXT PRIMARY KEY, title TEXT, icon TEXT, time INTEGER, position REAL DEFAULT 0, duration REAL DEFAULT 0, watched INTEGER DEFAULT 0)')
+    conn.execute('CREATE INDEX IF NOT EXISTS history_time ON history (time)')
+    # Past searches; results is the JSON of what the search returned, kept for search_cache_ttl
+    conn.execute('CREATE TABLE IF NOT EXISTS searches (type TEXT, norm TEXT, query TEXT, time INTEGER, results TEXT, results_time INTEGER, '
+                 'PRIMARY KEY (type, norm))')
+    if os.path.exists(HISTORY_FILE):
+        _import_json_history(conn)
+    return conn
+
+def _import_json_history(conn):
+    """One-off migration of the old history.json"""
+    try:
+        with open(HISTORY_FILE, 'r') as f:
+            old = json.load(f)
+        with conn:
+            for h in old:
+                if h.get('url'):
+                    conn.execute('INSERT OR IGNORE INTO history (url, title, icon, time) VALUES (?, ?, ?, ?)',
+                                 (h['url'], h.get('title'), h.get('icon'), h.get('time', 0)))
+    except:
+        pass
+    try:
+        os.remove(HISTORY_FILE)
+    except OSError:
+        pass
+
+def load_history():
+    try:
+        conn = open_history()
+        try:
+            rows = conn.execute(
+                'SELECT title, url, icon, time, position, duration, watched FROM history ORDER BY time DESC LIMIT ?',
+                (get_setting_int('history_size', 100),)
+            ).fetchall()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return []
+    keys = ('title', 'url', 'icon', 'time', 'position', 'duration', 'watched')
+    return [dict(zip(keys, row)) for row in rows]
+
+def save_to_history(title, url, icon):
+    try:
+        conn = open_history()
+        try:
+            with conn:
+                # Update first so an existing resume point survives being played again
+                cur = conn.execute('UPDATE history SET title = ?, icon = ?, time = ? WHERE url = ?',
+                                   (title, icon, int(time.time()), url))
+                if not cur.rowcount:
+                    conn.execute('INSERT INTO history (url, title, icon, time) VALUES (?, ?, ?, ?)',
+                                 (url, title, icon, int(time.time())))
+            compact_history(conn)
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        xbmc.log('DhakaFlix: could not save history', xbmc.LOGWARNING)
+
+def compact_history(conn):
+    # Allow some slack over the cap so the delete only runs every few plays
+    cap = get_setting_int('history_size', 100)
+    count = conn.execute('SELECT COUNT(*) FROM history').fetchone()[0]
+    if count <= cap + max(10, cap // 4): return
+    with conn:
+        conn.execute('DELETE FROM history WHERE url NOT IN (SELECT url FROM history ORDER BY time DESC LIMIT ?)', (cap,))
+
+def update_watch_state(url, position, duration):
+    watched = bool(duration) and position >= duration * 0.9
+    try:
+        conn = open_history()
+        try:
+            with conn:
+                conn.execute('UPDATE history SET position = ?, duration = ?, watched = ? WHERE url = ?',
+                             (0 if watched else position, duration, int(watched), url))
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        pass
+
+def track_playback(url, playing=None, record=True, near_end=None):
+    """
+    Stays alive while the resolved video plays and stores its position every few seconds.
+    playing is what Kodi was handed, when that is not url itself (a downloaded copy or a mirror).
+    near_end is called once when less than NEXT_WARM_SECONDS are left.
+    Returns the last (position, duration) seen.
+    """
+    player = xbmc.Player()
+    monitor = xbmc.Monitor()
+    for _ in range(30):
+        if player.isPlayingVideo(): break
+        if monitor.waitForAbort(1): return 0, 0
+    else:
+        return 0, 0
+
+    position = duration = 0
+    last_save = time.time()
+    while player.isPlayingVideo() and not monitor.abortRequested():
+        try:
+            if unquote(player.getPlayingFile()) != unquote(playing or url): break
+            position = player.getTime()
+            duration = player.getTotalTime()
+        except RuntimeError:
+            break
+        if record and time.time() - last_save >= 10:
+            update_watch_state(url, position, duration)
+            last_save = time.time()
+        if near_end and duration and duration - position < NEXT_WARM_SECONDS:
+            near_end()
+            near_end = None
+        if monitor.waitForAbort(1): break
+    if record and position:
+        update_watch_state(url, position, duration)
+    return position, duration
+
+def format_time(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+def clear_history():
+    # Asks for confirmation then deletes the history
+    if xbmcgui.Dialog().yesno('DhakaFlix', 'Are you sure you want to clear Recently played media?'):
+        try:
+            conn = open_history()
+            try:
+                with conn:
+                    conn.execute('DELETE FROM history')
+            finally:
+                conn.close()
+            xbmcgui.Dialog().notification('DhakaFlix', 'History Cleared', xbmcgui.NOTIFICATION_INFO)
+            xbmc.executebuiltin('Container.Refresh')
+        except:
+            xbmcgui.Dialog().notification('DhakaFlix', 'Error Clearing History', xbmcgui.NOTIFICATION_ERROR)
+
+def history_menu():
+    history = load_history()
+    
+    if not history:
+        li = xbmcgui.ListItem("No Recently Played Media")
+        xbmcplugin.addDirectoryItem(HANDLE, "", li, isFolder=False)
+    else:
+        # --- NEW: CLEAR HISTORY BUTTON AT TOP ---
+        li = xbmcgui.ListItem("[COLOR red]Clear History[/COLOR]")
+        li.setArt({'icon': 'DefaultAddon.png', 'thumb': 'DefaultAddon.png'})
+        url = build_url("mode=clear_history")
+        xbmcplugin.addDirectoryItem(HANDLE, url, li, isFolder=False)
+        # ----------------------------------------
+
+        for item in history:
+            label = item['title']
+            info = {'title': item['title'], 'mediatype': 'video'}
+            if item['watched']:
+                info['playcount'] = 1
+            elif item['position']:
+                label += f" [COLOR yellow](resume {format_time(item['position'])})[/COLOR]"
+
+            li = xbmcgui.ListItem(label)
+            li.setInfo('video', info)
+            li.setArt({'icon': item.get('icon') or 'DefaultVideo.png', 'thumb': item.get('icon') or ''})
+            li.setProperty('IsPlayable', 'true')
+            if item['position'] and not item['watched']:
+                # Kodi offers "Resume from ..." for playable items carrying these
+                li.setProperty('ResumeTime', str(int(item['position'])))
+                li.setProperty('TotalTime', str(int(item['duration'])))
+            
+            url = play_url(item['url'], item['title'], item.get('icon') or '')
+            xbmcplugin.addDirectoryItem(HANDLE, url, li, isFolder=False)
+        
+    xbmcplugin.endOfDirectory(HANDLE)
+
+# --- LISTING CACHE ---
+
+def _listing_cache_path(url):
+    return os.path.join(LISTING_CACHE_DIR, hashlib.md5(url.encode('utf-8')).hexdigest() + '.json')
+
+def load_cached_listing(url):
+    path = _listing_cache_path(url)
+    try:
+        with open(path, 'r') as f:
+            entry = json.load(f)
+        if entry.get('url') != url: return None
+        if entry.get('parser') != PARSER_VERSION:
+            # Titles from an older parser: let save_cached_listing() redo them
+            for item in entry['items']:
+                item.pop('title', None)
+                item.pop('year', None)
+        # Bump mtime so eviction treats this entry as recently used
+        os.utime(path, None)
+        return entry
+    except:
+        return None
+
+def save_cached_listing(url, items, etag=None, last_modified=None, mtime=None, prune=True):
+    # Videos are stored with their parsed title and year, so later invocations,
+    # which start with an empty parser memo, don't parse them again
+    for item in items:
+        if not item['is_folder'] and 'title' not in item and VIDEO_EXT_RE.search(item['url']):
+            item['title'], item['year'] = extract_meta(item['label'])
+    entry = {
+        'url': url,
+        'items': items,
+        'etag': etag,
+        'last_modified': last_modified,
+        'mtime': mtime,
+        'carried': _API_CARRIED.get(url),
+        'parser': PARSER_VERSION,
+        'time': int(time.time())
+    }
+    try:
+        write_json_atomic(_listing_cache_path(url), entry)
+        if prune: prune_listing_cache()
+    except:
+        pass
+
+def prune_listing_cache():
+    """Evicts least recently used listings once the cache exceeds its size cap"""
+    max_bytes = get_setting_int('listing_cache_size', 50) * 1024 * 1024
+    try:
+        entries = []
+        total = 0
+        for name in os.listdir(LISTING_CACHE_DIR):
+            path = os.path.join(LISTING_CACHE_DIR, name)
+            st = os.stat(path)
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+        if total <= max_bytes: return
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= max_bytes: break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+    except OSError:
+        pass
+
+# --- SHARED FETCHES ---
+# Kodi can run several invocations at once (home-screen widgets, skin prefetch,
+# a double click), each about to fetch the same listing or run the same search.
+# The first one takes a lock file for it; the others wait for the lock to go
+# away and then read what it saved instead of asking the servers again.
+# While a fetch runs its lock's mtime is refreshed every FLIGHT_HEARTBEAT, so a
+# lock that stops being refreshed belongs to an invocation that died and is
+# taken over. (Kodi runs every add-on interpreter inside its own process, so a
+# PID can't tell a live holder from a dead one.)
+
+FLIGHT_DIR = os.path.join(CACHE_DIR, 'inflight')
+FLIGHT_POLL = 0.02
+FLIGHT_HEARTBEAT = 2
+FLIGHT_STALE = 3 * FLIGHT_HEARTBEAT
+_HELD_FLIGHTS = set()
+_FLIGHT_LOCK = threading.Lock()
+_FLIGHT_BEAT = None
+
+def _flight_path(key):
+    return os.path.join(FLIGHT_DIR, hashlib.md5(key.encode('utf-8')).hexdigest() + '.lock')
+
+def _claim_flight(path):
+    """True if the lock file was created by this call"""
+    for _ in range(2):
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except FileExistsError:
+            return False
+        except FileNotFoundError:
+            os.makedirs(FLIGHT_DIR, exist_ok=True)
+    raise OSError(f'cannot create {path}')
+
+def _heartbeat():
+    # One thread refreshes every lock this process holds; it exits when none are left
+    global _FLIGHT_BEAT
+    while True:
+        time.sleep(FLIGHT_HEARTBEAT)
+        with _FLIGHT_LOCK:
+            if not _HELD_FLIGHTS:
+                _FLIGHT_BEAT = None
+                return
+            held = list(_HELD_FLIGHTS)
+        for path in held:
+            try:
+                os.utime(path, None)
+            except OSError:
+                pass
+
+def _hold_flight(path, held):
+    global _FLIGHT_BEAT
+    with _FLIGHT_LOCK:
+        if held:
+            _HELD_FLIGHTS.add(path)
+            if _FLIGHT_BEAT is None:
+                _FLIGHT_BEAT = threading.Thread(target=_heartbeat, daemon=True)
+                _FLIGHT_BEAT.start()
+        else:
+            _HELD_FLIGHTS.discard(path)
+
+def _drop_stale_flight(path):
+    # Renamed away first, so of several waiters only one removes it
+    stale = f"{path}.{os.urandom(4).hex()}"
+    try:
+        os.rename(path, stale)
+        os.remove(stale)
+    except OSError:
+        pass
+
+def _wait_flight(path):
+    """
+    Waits for another invocation's lock to go away. True if it was stale and
+    this call took it over, False once it was released or the wait ran out.
+    """
+    start = time.perf_counter()
+    deadline = time.time() + 2 * sum(http_timeout())
+    try:
+        while time.time() < deadline:
+            try:
+                age = time.time() - os.stat(path).st_mtime
+            except OSError:
+                return False
+            if age > FLIGHT_STALE:
+                _drop_stale_flight(path)
+                try:
+                    if _claim_flight(path): return True
+                except OSError:
+                    return False
+                continue
+            time.sleep(FLIGHT_POLL)
+        return False
+    finally:
+        perf_add('flight.wait', start)
+
+@contextmanager
+def shared_fetch(key):
+    """
+    Yields True when the caller should do the fetch itself (it holds the lock,
+    or the profile can't hold one), False once another invocation doing the
+    same fetch has finished or taken too long; the caller then checks the
+    cache before fetching.
+    """
+    path = _flight_path(key)
+    try:
+        owner = _claim_flight(path) or _wait_flight(path)
+    except OSError:
+        yield True
+        return
+    if owner: _hold_flight(path, True)
+    try:
+        yield owner
+    finally:
+        if owner:
+            _hold_flight(path, False)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+# --- FOLDER ART CACHE ---
+# Maps folder URL -> {'art': image url or None, 'time': checked at}.
+# Misses are stored too, so folders without a poster are not re-scraped every visit.
+
+def load_art_cache():
+    try:
+        with open(ART_CACHE_FILE, 'r') as f:
+            return json.load(f)
+    except:
+        return {}
+
+def save_art_cache(updates):
+    if not updates: return
+    try:
+        # Re-read before writing so entries saved by another invocation are kept
+        cache = load_art_cache()
+        cache.update(updates)
+        if len(cache) > ART_CACHE_MAX_ENTRIES:
+            # Every browse reads and rewrites the whole file: drop the entries checked longest ago
+            keep = sorted(cache.items(), key=lambda e: e[1].get('time', 0))[-ART_CACHE_MAX_ENTRIES:]
+            cache = dict(keep)
+        write_json_atomic(ART_CACHE_FILE, cache)
+    except:
+        pass
+
+def is_art_entry_fresh(entry, now):
+    if entry.get('art'):
+        ttl = get_setting_int('art_cache_hit_ttl', 30) * 86400
+    else:
+        ttl = get_setting_int('art_cache_miss_ttl', 24) * 3600
+    return now - entry.get('time', 0) < ttl
+
+def clear_cache():
+    try:
+        for name in os.listdir(LISTING_CACHE_DIR):
+            os.remove(os.path.join(LISTING_CACHE_DIR, name))
+    except OSError:
+        pass
+    try:
+        if os.path.exists(ART_CACHE_FILE):
+            os.remove(ART_CACHE_FILE)
+    except OSError:
+        pass
+    try:
+        # The queries stay in Recent Searches; only their stored results go
+        conn = open_history()
+        try:
+            with conn:
+                conn.execute('UPDATE searches SET results = NULL, results_time = NULL')
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        pass
+    xbmcgui.Dialog().notification('DhakaFlix', 'Cache Cleared', xbmcgui.NOTIFICATION_INFO)
+
+# --- HTTP SESSIONS ---
+# One keep-alive session per host, shared by browse and search, so the art scan
+# and multi-server searches reuse connections instead of reconnecting every time.
+
+_SESSIONS = {}
+_SESSIONS_LOCK = threading.Lock()
+_HTTP_TIMEOUT = None
+
+def get_session(url):
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+    host = urlparse(url).netloc
+    with _SESSIONS_LOCK:
+        session = _SESSIONS.get(host)
+        if session is None:
+            retries = Retry(
+                total=get_setting_int('http_retries', 1),
+                backoff_factor=0.3,
+                status_forcelist=(502, 503, 504),
+                raise_on_status=False
+            )
+            # Pool sized to the scheduler's per-host ceiling so no request waits for a free connection
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(MAX_THREADS, get_scheduler().host_max), max_retries=retries)
+            session = requests.Session()
+            session.headers['User-Agent'] = 'Mozilla/5.0'
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _SESSIONS[host] = session
+    return session
+
+def http_timeout():
+    """(connect, read) timeout tuple from settings"""
+    global _HTTP_TIMEOUT
+    if _HTTP_TIMEOUT is None:
+        _HTTP_TIMEOUT = (get_setting_int('http_connect_timeout', 3), get_setting_int('http_read_timeout', 10))
+    return _HTTP_TIMEOUT
+
+def reload_settings():
+    """For the long-running service: picks up settings changed since start"""
+    global ADDON, _HTTP_TIMEOUT
+    ADDON = xbmcaddon.Addon()
+    _HTTP_TIMEOUT = None
+    with _SESSIONS_LOCK:
+        _SESSIONS.clear()
+    if _SCHEDULER is not None: _SCHEDULER.load_settings()
+
+class Throttle:
+    """Caps the average transfer rate by sleeping after each response (background service only)"""
+    def __init__(self, bytes_per_sec):
+        self.rate = bytes_per_sec
+        self.lock = threading.Lock()
+        self.next_free = time.time()
+
+    def consume(self, nbytes):
+        with self.lock:
+            now = time.time()
+            self.next_free = max(self.next_free, now) + nbytes / self.rate
+            delay = self.next_free - now
+        if delay > 0: time.sleep(min(delay, 5))
+
+_THROTTLE = None
+
+def set_bandwidth_limit(kbytes_per_sec):
+    global _THROTTLE
+    _THROTTLE = Throttle(kbytes_per_sec * 1024) if kbytes_per_sec > 0 else None
+
+# --- REQUEST SCHEDULER ---
+# Every request waits here for a slot on its host. Each host's limit follows
+# AIMD: one more slot per window of normal answers (per answer until the
+# first sign of congestion), halved on errors and on answers far slower than
+# the host usually is, so a busy server gets fewer
+# parallel requests instead of a pile of timeouts. Limits are kept in the
+# health record, so the next invocation starts where this one left off.
+# A global cap bounds the total, and a freed slot goes to the most urgent
+# lane first: a listing the user is waiting for overtakes queued art lookups.
+
+LANE_INTERACTIVE = 0  # listings, searches and mirror probes the user waits for
+LANE_ART = 1          # folder art scans
+LANE_BACKGROUND = 2   # prefetch, index crawls, the background service
+
+HOST_START_LIMIT = 4
+SLOW_FACTOR = 2       # an answer this many times slower than the host's best counts as congestion...
+SLOW_FLOOR = 0.5      # ...if it also took longer than this (seconds)
+BASE_DRIFT = 1.005    # the best latency creeps up unless renewed, so a server that got slower for good is relearned
+
+class HostLimit:
+    def __init__(self, limit, latency):
+        # A host seen before starts at its saved limit; a new one ramps up fast from HOST_START_LIMIT
+        self.slow_start = limit is None
+        self.limit = limit or HOST_START_LIMIT
+        self.latency = latency  # best recent answer time, what an idle server takes
+        self.active = 0
+        self.last_decrease = 0
+
+class Scheduler:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hosts = {}
+        self.waiting = []  # sorted (lane, arrival, host, event) tickets
+        self.arrivals = 0
+        self.active = 0
+        self.load_settings()
+
+    def load_settings(self):
+        with self.lock:
+            self.global_max = max(1, get_setting_int('max_connections', 20))
+            self.host_max = max(1, get_setting_int('host_connections', 12))
+            self._dispatch()
+
+    def _dispatch(self):
+        # Slots are handed straight to the chosen waiters (lock held), rather
+        # than waking every thread to race for them
+        while self.waiting and self.active < self.global_max:
+            for ticket in self.waiting:
+                h = self.hosts[ticket[2]]
+                if h.active < min(int(h.limit), self.host_max): break
+            else:
+                return
+            self.waiting.remove(ticket)
+            h.active += 1
+            self.active += 1
+            ticket[3].set()
+
+    def acquire(self, host, lane):
+        if host not in self.hosts:
+            with _HEALTH_LOCK:
+                record = _host_record(host)
+                saved = (record.get('limit'), record['latency'])
+        with self.lock:
+            if host not in self.hosts:
+                self.hosts[host] = HostLimit(saved[0], saved[1] / 1000 if saved[1] else None)
+            ticket = (lane, self.arrivals, host, threading.Event())
+            self.arrivals += 1
+            bisect.insort(self.waiting, ticket)
+            self._dispatch()
+        ticket[3].wait()
+
+    def release(self, host, start, latency, ok):
+        """start: when the request was sent; latency is None when it failed without an answer"""
+        with self.lock:
+            h = self.hosts[host]
+            h.active -= 1
+            self.active -= 1
+            slow = ok and h.latency is not None and latency > max(SLOW_FLOOR, SLOW_FACTOR * h.latency)
+            if not ok or slow:
+                # Requests sent before the last decrease saw the old limit;
+                # one overload is one signal, however many of them fail
+                if start >= h.last_decrease:
+                    h.limit = max(1.0, h.limit / 2)
+                    h.last_decrease = time.time()
+                    h.slow_start = False
+            else:
+                h.limit = min(float(self.host_max), h.limit + (1 if h.slow_start else 1 / h.limit))
+            if ok:
+                h.latency = latency if h.latency is None else min(latency, h.latency * BASE_DRIFT)
+            limit = h.limit
+            self._dispatch()
+        with _HEALTH_LOCK:
+            _host_record(host)['limit'] = round(limit, 2)
+            _HEALTH_DIRTY.add(host)
+
+_SCHEDULER = None
+_SCHEDULER_LOCK = threading.Lock()
+_LANE = threading.local()
+_DEFAULT_LANE = LANE_INTERACTIVE
+
+def get_scheduler():
+    global _SCHEDULER
+    with _SCHEDULER_LOCK:
+        if _SCHEDULER is None: _SCHEDULER = Scheduler()
+    return _SCHEDULER
+
+def current_lane():
+    lane = getattr(_LANE, 'lane', None)
+    return _DEFAULT_LANE if lane is None else lane
+
+def set_default_lane(lane):
+    """For the background service: everything it fetches is background work"""
+    global _DEFAULT_LANE
+    _DEFAULT_LANE = lane
+
+@contextmanager
+def request_lane(lane):
+    """Requests made by this thread inside the block use lane (never a more urgent one than the current)"""
+    previous = getattr(_LANE, 'lane', None)
+    _LANE.lane = max(lane, current_lane())
+    try:
+        yield
+    finally:
+        _LANE.lane = previous
+
+def in_lane(fn, lane):
+    """fn for an executor: worker threads don't inherit the submitting thread's lane"""
+    lane = max(lane, current_lane())
+    def run(*args):
+        with request_lane(lane):
+            return fn(*args)
+    return run
+
+# --- INSTRUMENTATION ---
+# Opt-in (perf_stats setting). Phases add their elapsed time with perf_add();
+# http_request() counts requests, bytes and errors per host. One compact record
+# per invocation goes to the Kodi log and to a rolling stats file.
+
+_PERF = None
+_PERF_LOCK = threading.Lock()
+
+def perf_start(mode):
+    global _PERF
+    if get_setting_bool('perf_stats', False):
+        _PERF = {'mode': mode or 'main', 'start': time.perf_counter(), 'phases': {}, 'hosts': {}}
+
+def perf_add(phase, since):
+    """Adds the time elapsed since the perf_counter() value `since` to a phase"""
+    if _PERF is None: return
+    elapsed = time.perf_counter() - since
+    with _PERF_LOCK:
+        _PERF['phases'][phase] = _PERF['phases'].get(phase, 0) + elapsed
+
+def perf_request(host, nbytes, error):
+    if _PERF is None: return
+    with _PERF_LOCK:
+        h = _PERF['hosts'].setdefault(host, {'requests': 0, 'bytes': 0, 'errors': 0})
+        h['requests'] += 1
+        h['bytes'] += nbytes
+        if error: h['errors'] += 1
+
+def perf_finish():
+    global _PERF
+    if _PERF is None: return
+    perf, _PERF = _PERF, None
+    record = {
+        'time': int(time.time()),
+        'mode': perf['mode'],
+        'total_ms': round((time.perf_counter() - perf['start']) * 1000, 1),
+        'phases': {k: round(v * 1000, 1) for k, v in perf['phases'].items()},
+        'hosts': perf['hosts']
+    }
+    line = json.dumps(record, separators=(',', ':'))
+    xbmc.log(f"DhakaFlix perf: {line}", xbmc.LOGINFO)
+    try:
+        if not os.path.exists(PROFILE_DIR):
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+        with open(PERF_FILE, 'a') as f:
+            f.write(line + '\n')
+        # Trim only once the file is well past the cap, not on every write
+        if os.path.getsize(PERF_FILE) > PERF_MAX_RECORDS * 600:
+            with open(PERF_FILE, 'r') as f:
+                lines = f.readlines()[-PERF_MAX_RECORDS:]
+            tmp_path = f"{PERF_FILE}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                f.writelines(lines)
+            os.replace(tmp_path, PERF_FILE)
+    except OSError:
+        pass
+
+def load_perf_records():
+    records = []
+    try:
+        with open(PERF_FILE, 'r') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    pass
+    except OSError:
+        pass
+    return records
+
+def _percentile(sorted_values, q):
+    return sorted_values[int(round(q * (len(sorted_values) - 1)))]
+
+def perf_stats_menu():
+    records = load_perf_records()
+    if not records:
+        msg = "No stats yet" if get_setting_bool('perf_stats', False) else "No stats yet - enable them in the addon settings"
+        xbmcplugin.addDirectoryItem(HANDLE, "", xbmcgui.ListItem(msg), isFolder=False)
+        xbmcplugin.endOfDirectory(HANDLE)
+        return
+
+    timings = {}
+    hosts = {}
+    for r in records:
+        timings.setdefault(f"{r['mode']} (total)", []).append(r['total_ms'])
+        for phase, ms in r.get('phases', {}).items():
+            timings.setdefault(phase, []).append(ms)
+        for host, h in r.get('hosts', {}).items():
+            agg = hosts.setdefault(host, {'requests': 0, 'bytes': 0, 'errors': 0})
+            for key in agg: agg[key] += h.get(key, 0)
+
+    for name in sorted(timings):
+        values = sorted(timings[name])
+        label = f"{name}: p50 {_percentile(values, 0.5):.0f} ms, p95 {_percentile(values, 0.95):.0f} ms (n={len(values)})"
+        xbmcplugin.addDirectoryItem(HANDLE, "", xbmcgui.ListItem(label), isFolder=False)
+    for host in sorted(hosts):
+        h = hosts[host]
+        label = f"[COLOR grey]{host}: {h['requests']} requests, {h['bytes'] / 1048576:.1f} MB, {h['errors']} errors[/COLOR]"
+        xbmcplugin.addDirectoryItem(HANDLE, "", xbmcgui.ListItem(label), isFolder=False)
+    xbmcplugin.endOfDirectory(HANDLE)
+
+# --- SERVER HEALTH / CIRCUIT BREAKER ---
+# Per-host latency and error stats, persisted across plugin invocations. After
+# enough consecutive failures a host is skipped for a cooldown, then probed with
+# a bare TCP connect before real requests go to it again.
+
+class HostUnavailable(Exception):
+    pass
+
+_HEALTH = None
+_HEALTH_DIRTY = set()
+_HEALTH_LOCK = threading.Lock()
+_PROBED = {}
+HEALTH_ALPHA = 0.2
+
+def _load_health():
+    global _HEALTH
+    if _HEALTH is None:
+        try:
+            with open(HEALTH_FILE, 'r') as f:
+                _HEALTH = json.load(f)
+        except:
+            _HEALTH = {}
+    return _HEALTH
+
+def _host_record(host):
+    return _load_health().setdefault(host, {
+        'latency': None, 'error_rate': 0.0, 'requests': 0, 'errors': 0,
+        'failures': 0, 'last_failure': None, 'open_until': 0
+    })
+
+def record_host_result(host, latency, ok, busy=False):
+    """busy: the server answered 503; it is overloaded, not down, so the breaker is left alone"""
+    now = time.time()
+    with _HEALTH_LOCK:
+        h = _host_record(host)
+        h['requests'] += 1
+        if ok:
+            ms = latency * 1000
+            h['latency'] = ms if h['latency'] is None else h['latency'] * (1 - HEALTH_ALPHA) + ms * HEALTH_ALPHA
+            h['error_rate'] *= (1 - HEALTH_ALPHA)
+            h['failures'] = 0
+            h['open_until'] = 0
+        else:
+            h['errors'] += 1
+            h['error_rate'] = h['error_rate'] * (1 - HEALTH_ALPHA) + HEALTH_ALPHA
+            # Backing off a busy server is the scheduler's job
+            if busy:
+                _HEALTH_DIRTY.add(host)
+                return
+            h['failures'] += 1
+            h['last_failure'] = int(now)
+            if h['failures'] >= get_setting_int('breaker_failures', 3):
+                h['open_until'] = now + get_setting_int('breaker_cooldown', 60)
+        _HEALTH_DIRTY.add(host)
+
+def probe_host(host, timeout=1.5):
+    import socket
+    hostname, _, port = host.partition(':')
+    try:
+        socket.create_connection((hostname, int(port or 80)), timeout=timeout).close()
+        return True
+    except (OSError, ValueError):
+        return False
+
+def host_available(host):
+    with _HEALTH_LOCK:
+        h = _load_health().get(host)
+        if not h or h['failures'] < get_setting_int('breaker_failures', 3): return True
+        if time.time() < h.get('open_until', 0): return False
+        # Cooldown over: one cheap probe per process decides whether to close the breaker
+        if host not in _PROBED:
+            ok = probe_host(host)
+            _PROBED[host] = ok
+            if ok:
+                h['failures'] = 0
+                h['open_until'] = 0
+            else:
+                h['last_failure'] = int(time.time())
+                h['open_until'] = time.time() + get_setting_int('breaker_cooldown', 60)
+            _HEALTH_DIRTY.add(host)
+        return _PROBED[host]
+
+def http_request(method, url, **kwargs):
+    """Session request that honours the circuit breaker and feeds the host's health record"""
+    import requests
+    host = urlparse(url).netloc
+    if not host_available(host): raise HostUnavailable(host)
+    scheduler = get_scheduler()
+    scheduler.acquire(host, current_lane())
+    latency, ok = None, False
+    start = time.time()
+    try:
+        r = get_session(url).request(method, url, timeout=http_timeout(), **kwargs)
+        latency, ok = time.time() - start, r.status_code < 500
+    except requests.RequestException:
+        record_host_result(host, None, False)
+        perf_request(host, 0, True)
+        raise
+    finally:
+        scheduler.release(host, start, latency, ok)
+    record_host_result(host, latency, ok, busy=r.status_code == 503)
+    if _PERF is not None or _THROTTLE is not None:
+        nbytes = int(r.headers.get('Content-Length') or 0) if kwargs.get('stream') else len(r.content)
+        perf_request(host, nbytes, r.status_code >= 500)
+        if _THROTTLE is not None and not kwargs.get('stream'): _THROTTLE.consume(nbytes)
+    return r
+
+def save_health():
+    if not _HEALTH_DIRTY: return
+    try:
+        # Merge into what other invocations saved meanwhile; our hosts win
+        with open(HEALTH_FILE, 'r') as f:
+            merged = json.load(f)
+    except:
+        merged = {}
+    try:
+        with _HEALTH_LOCK:
+            for host in _HEALTH_DIRTY:
+                merged[host] = _HEALTH[host]
+        write_json_atomic(HEALTH_FILE, merged)
+    except:
+        pass
+
+def reload_health():
+    """Saves, then drops the in-memory state so plugin invocations' results are seen (service only)"""
+    global _HEALTH
+    save_health()
+    with _HEALTH_LOCK:
+        _HEALTH = None
+        _HEALTH_DIRTY.clear()
+        _PROBED.clear()
+
+def known_hosts():
+    """(host, name) for every server the addon talks to"""
+    hosts = {}
+    for servers in SEARCH_SERVERS.values():
+        for srv in servers:
+            hosts[urlparse(srv['url']).netloc] = srv['name']
+    for _, link in MOVIE_CATEGORIES + SERIES_CATEGORIES:
+        host = urlparse(link).netloc
+        hosts.setdefault(host, host)
+    return sorted(hosts.items(), key=lambda h: h[1])
+
+def diagnostics_menu():
+    li = xbmcgui.ListItem("[COLOR yellow]Check all servers now[/COLOR]")
+    li.setArt({'icon': 'DefaultAddon.png'})
+    xbmcplugin.addDirectoryItem(HANDLE, build_url("mode=probe_servers"), li, isFolder=False)
+
+    li = xbmcgui.ListItem("[COLOR yellow]Performance stats[/COLOR]")
+    li.setArt({'icon': 'DefaultAddon.png'})
+    xbmcplugin.addDirectoryItem(HANDLE, build_url("mode=perf_stats"), li, isFolder=True)
+
+    health = _load_health()
+    now = time.time()
+    for host, name in known_hosts():
+        h = health.get(host)
+        if not h:
+            status = "[COLOR grey]no data yet[/COLOR]"
+        elif now < h.get('open_until', 0):
+            status = f"[COLOR red]DOWN[/COLOR] - retry in {int(h['open_until'] - now)}s"
+        elif h['failures']:
+            status = f"[COLOR orange]{h['failures']} recent failures[/COLOR]"
+        else:
+            status = "[COLOR green]OK[/COLOR]"
+        details = ""
+        if h:
+            if h.get('latency') is not None: details += f", {int(h['latency'])} ms"
+            if h.get('limit'): details += f", {int(h['limit'])} parallel"
+            details += f", {int(h['error_rate'] * 100)}% errors"
+            if h.get('last_failure'):
+                details += f", last failure {time.strftime('%d %b %H:%M', time.localtime(h['last_failure']))}"
+        li = xbmcgui.ListItem(f"{name} ({host}) - {status}{details}")
+        li.setArt({'icon': 'DefaultNetwork.png'})
+        xbmcplugin.addDirectoryItem(HANDLE, "", li, isFolder=False)
+    xbmcplugin.endOfDirectory(HANDLE)
+
+def check_all_hosts():
+    for host, _ in known_hosts():
+        start = time.time()
+        ok = probe_host(host)
+        record_host_result(host, time.time() - start, ok)
+
+def probe_servers():
+    check_all_hosts()
+    xbmc.executebuiltin('Container.Refresh')
+
+# --- NETWORK / SCRAPING (BROWSE MODE) ---
+
+def fetch_page(url, etag=None, last_modified=None):
+    """Returns (status, text, headers). Sends validators so the server can answer 304."""
+    headers = {}
+    if etag: headers['If-None-Match'] = etag
+    if last_modified: headers['If-Modified-Since'] = last_modified
+    try:
+        r = http_request('GET', url, headers=headers)
+        if r.status_code == 200: return 200, r.text, r.headers
+        return r.status_code, None, r.headers
+    except: pass
+    return None, None, {}
+
+def get_html(url):
+    status, html, _ = fetch_page(url)
+    return html
+
+# Compiled once; each page is scanned in a single pass
+HREF_RE = re.compile(r'href=["\']([^"\']*)["\']', re.IGNORECASE)
+IMAGE_EXTS = ('.jpg', '.png', '.jpeg')
+SKIP_HREFS = {'/', '..', '../', './', 'Parent Directory'}
+SKIP_LABELS = {'_h5ai', 'h5ai', 'h51i', 'parent directory'}
+
+def find_folder_image(items):
+    for item in items:
+        if not item['is_folder'] and item['url'].lower().endswith(IMAGE_EXTS):
+            return item['url']
+    return None
+
+def _make_item(url, href, size=None, mtime=None):
+    decoded = unquote(href)
+    if decoded.endswith('/'): decoded = decoded[:-1]
+    label = decoded.split('/')[-1]
+    if not label or label.lower() in SKIP_LABELS or '_h5ai' in href: return None
+
+    full_url = urljoin(url, href)
+    is_folder = href.endswith('/')
+    ext = full_url.split('.')[-1].lower()
+    if ext in ['mkv', 'mp4']: is_folder = False
+
+    item = {'label': label, 'url': full_url, 'is_folder': is_folder}
+    if size is not None: item['size'] = size
+    if mtime is not None: item['mtime'] = mtime
+    return item
+
+def parse_links(url, html):
+    """Fallback for servers without the h5ai API: pulls entries out of the HTML page"""
+    items = []
+    for href in HREF_RE.findall(html):
+        if href.startswith(('?', '#')) or href in SKIP_HREFS or 'sort_by' in href: continue
+        item = _make_item(url, href)
+        if item: items.append(item)
+    return items
+
+# --- H5AI ITEMS API ---
+# The same JSON endpoint the search uses can list a folder with sizes and
+# mtimes. It also returns the content of every folder above the one asked for,
+# so below a big folder (a category with hundreds of titles) the HTML page is
+# far smaller: the API is only used while that baggage stays small.
+
+_NO_API_HOSTS = set()
+API_MISSING_STATUSES = (400, 405, 501)
+API_MAX_CARRIED = 200
+_API_CARRIED = {}  # folder url -> entries an API listing of it returns, its own and all its parents'
+
+def _parent_url(url):
+    return url.rstrip('/').rsplit('/', 1)[0] + '/'
+
+def _api_carried(url):
+    """Entries an API listing of url returns, if known from this process or the listing cache"""
+    if url not in _API_CARRIED:
+        cached = load_cached_listing(url)
+        if cached and cached.get('carried') is not None: _API_CARRIED[url] = cached['carried']
+    return _API_CARRIED.get(url)
+
+def _at_category_depth(url):
+    """Whether url is a category folder or one above it, where the parents hold little"""
+    parsed = urlparse(url)
+    path = unquote(parsed.path)
+    if not path.endswith('/'): path += '/'
+    for _, link in MOVIE_CATEGORIES + SERIES_CATEGORIES:
+        category = urlparse(link)
+        if category.netloc == parsed.netloc and unquote(category.path).startswith(path): return True
+    return False
+
+def _api_pays(url):
+    """
+    Whether listing url through the API beats the HTML page. Below a category
+    that is unknown until the parent has been listed (a folder opened from
+    search or history), and then the HTML page is the safe choice.
+    """
+    carried = _api_carried(_parent_url(url))
+    if carried is None: return _at_category_depth(url)
+    return carried <= API_MAX_CARRIED
+
+def _note_html_listing(url, items):
+    # An HTML listing says nothing about the parents, but they are known from the parent
+    carried = _API_CARRIED.get(_parent_url(url))
+    if carried is not None: _API_CARRIED[url] = carried + len(items)
+
+def _api_get_items(url, what):
+    """Returns the raw h5ai items for url, or None if the API is unavailable"""
+    host = urlparse(url).netloc
+    if host in _NO_API_HOSTS: return None
+    payload = {"action": "get", "items": {"href": urlparse(url).path, "what": what}}
+    try:
+        r = http_request('POST', url, json=payload)
+    except:
+        return None
+    # Plain web server or h5ai with the API disabled: stop asking for this process.
+    # Anything else (404, a busy or failing server) only fails this listing.
+    if r.status_code in API_MISSING_STATUSES:
+        _NO_API_HOSTS.add(host)
+        return None
+    if r.status_code != 200: return None
+    try:
+        return r.json()['items']
+    except:
+        _NO_API_HOSTS.add(host)
+        return None
+
+def _api_mtime(item):
+    return int(item['time'] / 1000) if item.get('time') else None
+
+def fetch_listing_api(url):
+    """Returns (folder mtime, items) from the h5ai items API, or None"""
+    if not _api_pays(url): return None
+    raw = _api_get_items(url, 1)
+    if raw is None: return None
+    _API_CARRIED[url] = len(raw)
+    path = unquote(urlparse(url).path)
+    if not path.endswith('/'): path += '/'
+
+    mtime = None
+    items = []
+    for entry in raw:
+        href = entry.get('href', '')
+        decoded = unquote(href)
+        if decoded == path:
+            mtime = _api_mtime(entry)
+            continue
+        # The response also carries parent folders; keep direct children only
+        if decoded.rstrip('/').rsplit('/', 1)[0] + '/' != path: continue
+        item = _make_item(url, href, entry.get('size'), _api_mtime(entry))
+        if item: items.append(item)
+    return mtime, items
+
+def fetch_dir_mtime(url):
+    """Cheap revalidation probe: the folder's own mtime changes when its content does"""
+    raw = _api_get_items(url, 0)
+    if not raw: return None
+    path = unquote(urlparse(url).path)
+    for entry in raw:
+        if unquote(entry.get('href', '')) == path:
+            return _api_mtime(entry)
+    return None
+
+def load_listing(url):
+    """Uncached listing fetch: h5ai API first, HTML scrape as fallback. None if both failed."""
+    listing = fetch_listing_api(url)
+    if listing is not None: return listing[1]
+    html = get_html(url)
+    if html is None: return None
+    items = parse_links(url, html)
+    _note_html_listing(url, items)
+    return items
+
+def fetch_links(url, prune=True, max_age=None):
+    """Cached directory listing; max_age (seconds) overrides the listing_cache_ttl setting"""
+    cached = load_cached_listing(url)
+    ttl = max_age if max_age is not None else get_setting_int('listing_cache_ttl', 60) * 60
+    if cached and time.time() - cached.get('time', 0) < ttl:
+        return cached['items']
+
+    started = int(time.time())
+    with shared_fetch('listing:' + url) as owner:
+        if not owner:
+            # Another invocation was fetching this listing: use what it saved
+            latest = load_cached_listing(url)
+            if latest and latest.get('time', 0) >= started: return latest['items']
+            cached = latest or cached
+        return _refresh_listing(url, cached, prune)
+
+def _refresh_listing(url, cached, prune):
+    """Revalidates or refetches a listing whose cache entry (if any) has expired"""
+    if cached and cached.get('carried') is not None: _API_CARRIED.setdefault(url, cached['carried'])
+    if cached and cached.get('mtime') is not None:
+        mtime = fetch_dir_mtime(url)
+        if mtime is not None and mtime == cached['mtime']:
+            # Unchanged on the server: keep the parsed items, just restart the TTL
+            save_cached_listing(url, cached['items'], mtime=mtime, prune=prune)
+            return cached['items']
+    elif cached and (cached.get('etag') or cached.get('last_modified')):
+        status, html, headers = fetch_page(url, cached.get('etag'), cached.get('last_modified'))
+        if status == 304:
+            save_cached_listing(url, cached['items'], cached.get('etag'), cached.get('last_modified'), prune=prune)
+            return cached['items']
+        if html:
+            items = parse_links(url, html)
+            _note_html_listing(url, items)
+            save_cached_listing(url, items, headers.get('ETag'), headers.get('Last-Modified'), prune=prune)
+            return items
+
+    listing = fetch_listing_api(url)
+    if listing is not None:
+        mtime, items = listing
+        save_cached_listing(url, items, mtime=mtime, prune=prune)
+        return items
+
+    status, html, headers = fetch_page(url)
+    if not html:
+        # Server unreachable: a stale listing is better than an empty folder
+        return cached['items'] if cached else []
+
+    items = parse_links(url, html)
+    _note_html_listing(url, items)
+    save_cached_listing(url, items, headers.get('ETag'), headers.get('Last-Modified'), prune=prune)
+    return items
+
+# --- SEARCH LOGIC (MULTI-SERVER API) ---
+
+def execute_single_search(query, server):
+    """Hits one server"""
+    search_url = f"{server['url']}/{server['name']}/"
+    payload = {
+        "action": "get",
+        "search": {
+            "href": f"/{server['name']}/",
+            "pattern": query,
+            "ignorecase": True
+        }
+    }
+    
+    try:
+        r = http_request('POST', search_url, json=payload)
+        if r.status_code == 200:
+            data = r.json()
+            if 'search' in data:
+                return [
+                    {
+                        'href': item['href'],
+                        'fullUrl': server['url'] + item['href'],
+                        'label': unquote(item['href'].split('/')[-1]),
+                        'size': item.get('size')
+                    }
+                    for item in data['search']
+                    if item.get('size') is not None and item['href'].lower().endswith(('.mkv', '.mp4'))
+                ]
+    except:
+        pass
+    return []
+
+def get_smart_search_terms(query):
+    cleaned = re.sub(r'[:\-–—]', ' ', query)
+    cleaned = re.sub(r'\s+', ' ', cleaned).strip()
+    words = [w for w in cleaned.split(' ') if len(w) > 2]
+    
+    terms = []
+    terms.append(cleaned)
+    if len(words) > 1: terms.append(" ".join(words[:2]))
+    if len(words) > 2: terms.append(words[0])
+        
+    return list(dict.fromkeys(terms))
+
+# --- OFFLINE CATALOG (FULL-TEXT SEARCH INDEX) ---
+
+def open_catalog():
+    if not os.path.exists(PROFILE_DIR):
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+    conn = sqlite3.connect(CATALOG_DB, timeout=10)
+    conn.execute('CREATE TABLE IF NOT EXISTS files (id INTEGER PRIMARY KEY, type TEXT, name TEXT, url TEXT UNIQUE, size INTEGER, year INTEGER, quality TEXT)')
+    conn.execute('CREATE TABLE IF NOT EXISTS catalog_meta (key TEXT PRIMARY KEY, value TEXT)')
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(files)')]
+    if 'meta' not in columns:
+        # Parsed release metadata, so search hits need no re-parse
+        conn.execute('ALTER TABLE files ADD COLUMN meta TEXT')
+    if 'dir' not in columns:
+        conn.execute('ALTER TABLE files ADD COLUMN dir TEXT')
+    if 'parser' not in columns:
+        # PARSER_VERSION meta was parsed with; other rows' meta is ignored
+        conn.execute('ALTER TABLE files ADD COLUMN parser INTEGER')
+    conn.execute('CREATE INDEX IF NOT EXISTS files_dir ON files (dir)')
+    # Crawl state: what each folder looked like when it was last listed, the
+    # folders still to list (so an interrupted crawl resumes) and a change log
+    conn.execute('CREATE TABLE IF NOT EXISTS catalog_dirs (url TEXT PRIMARY KEY, type TEXT, parent TEXT, mtime INTEGER, leaf INTEGER)')
+    conn.execute('CREATE INDEX IF NOT EXISTS catalog_dirs_parent ON catalog_dirs (parent)')
+    conn.execute('CREATE TABLE IF NOT EXISTS catalog_queue (url TEXT PRIMARY KEY, type TEXT, parent TEXT, depth INTEGER, mtime INTEGER)')
+    conn.execute('CREATE TABLE IF NOT EXISTS catalog_changes (time INTEGER, type TEXT, action TEXT, name TEXT, url TEXT)')
+    # A folder that couldn't be listed while the index was being seeded is
+    # kept as "unlisted": its files aren't new when it is listed later on
+    if 'unlisted' not in [row[1] for row in conn.execute('PRAGMA table_info(catalog_dirs)')]:
+        conn.execute('ALTER TABLE catalog_dirs ADD COLUMN unlisted INTEGER')
+    if 'quiet' not in [row[1] for row in conn.execute('PRAGMA table_info(catalog_queue)')]:
+        conn.execute('ALTER TABLE catalog_queue ADD COLUMN quiet INTEGER')
+    try:
+        conn.execute('CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts5(title)')
+    except sqlite3.OperationalError:
+        # Some Kodi builds ship SQLite without FTS5
+        conn.execute('CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts4(title)')
+    return conn
+
+def _crawl_listing(url):
+    # Bypasses the listing cache: a full crawl would just churn it
+    return load_listing(url)
+
+def _crawl_folder(url, mtime, known_mtime, known_leaf):
+    """
+    Lists a queued folder for the crawl. Returns (mtime, items), with items None
+    if it could not be listed, or None if it is a leaf unchanged since the last crawl.
+    mtime is what the parent listing reported. An HTML listing reports none, so
+    then the folder's own is asked for with a what=0 call, which carries no content.
+    """
+    if mtime is not None: return mtime, _crawl_listing(url)
+    if known_leaf and known_mtime is not None:
+        mtime = fetch_dir_mtime(url)
+        if mtime is not None and mtime == known_mtime: return None
+        return mtime, _crawl_listing(url)
+    items = _crawl_listing(url)
+    # Only a leaf can be skipped by its mtime, so only a leaf needs one. Asked
+    # after listing, a change in between could be missed until the next one.
+    if known_leaf is None and items is not None and not any(i['is_folder'] for i in items):
+        mtime = fetch_dir_mtime(url)
+    return mtime, items
+
+def _index_files(conn, type_key, files, folder=None):
+    """Adds files to the index; returns (name, url) of the ones it did not have yet"""
+    added = []
+    for item in files:
+        meta = parse_release(item['label'])
+        cur = conn.execute(
+            'INSERT OR IGNORE INTO files (type, name, url, size, year, quality, meta, dir, parser) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (type_key, item['label'], item['url'], item.get('size'), meta['year'], meta['quality'], json.dumps(meta), folder, PARSER_VERSION)
+        )
+        if cur.rowcount:
+            conn.execute('INSERT INTO files_fts (rowid, title) VALUES (?, ?)', (cur.lastrowid, clean_title(item['label'])))
+            added.append((item['label'], item['url']))
+    return added
+
+def _remove_files(conn, where, args):
+    """Drops matching files from the index; returns their (name, url)"""
+    rows = conn.execute(f'SELECT id, name, url FROM files WHERE {where}', args).fetchall()
+    for file_id, _, _ in rows:
+        conn.execute('DELETE FROM files_fts WHERE rowid = ?', (file_id,))
+        conn.execute('DELETE FROM files WHERE id = ?', (file_id,))
+    return [(name, url) for _, name, url in rows]
+
+def _remove_subtree(conn, url):
+    # Folder urls end in '/', so a prefix match cannot catch a sibling
+    prefix = (len(url), url)
+    removed = _remove_files(conn, 'substr(dir, 1, ?) = ?', prefix)
+    conn.execute('DELETE FROM catalog_dirs WHERE substr(url, 1, ?) = ?', prefix)
+    conn.execute('DELETE FROM catalog_queue WHERE substr(url, 1, ?) = ?', prefix)
+    return removed
+
+def _apply_listing(conn, type_key, url, parent, depth, mtime, items, quiet=False):
+    """
+    Brings one folder's files and subfolders in the index up to date and queues
+    the subfolders that may have changed. Returns (added, removed) as (name, url) lists.
+    quiet marks the queued subfolders as never listed before (see open_catalog).
+    """
+    videos = [i for i in items if not i['is_folder'] and i['url'].lower().endswith(('.mkv', '.mp4'))]
+    subdirs = [i for i in items if i['is_folder']]
+
+    indexed = {row[0]: row[1] for row in conn.execute('SELECT url, parser FROM files WHERE dir = ?', (url,))}
+    current = {i['url'] for i in videos}
+    removed = []
+    for gone in set(indexed) - current:
+        removed += _remove_files(conn, 'url = ?', (gone,))
+    added = _index_files(conn, type_key, [i for i in videos if i['url'] not in indexed], url)
+    for item in videos:
+        if item['url'] in indexed and indexed[item['url']] != PARSER_VERSION:
+            meta = parse_release(item['label'])
+            conn.execute('UPDATE files SET year = ?, quality = ?, meta = ?, parser = ? WHERE url = ?',
+                         (meta['year'], meta['quality'], json.dumps(meta), PARSER_VERSION, item['url']))
+
+    known = {row[0]: row[1:] for row in conn.execute('SELECT url, mtime, leaf FROM catalog_dirs WHERE parent = ?', (url,))}
+    for gone in set(known) - {i['url'] for i in subdirs}:
+        removed += _remove_subtree(conn, gone)
+    if depth + 1 < MAX_CRAWL_DEPTH:
+        for sub in subdirs:
+            # A folder's mtime only moves when its own entries change, so an
+            # unchanged leaf is skipped. Folders with subfolders are always
+            # listed: a change further down never reaches their mtime. A leaf
+            # the listing gave no mtime for is queued and checked by _crawl_folder.
+            prev = known.get(sub['url'])
+            if prev and prev[0] is not None and prev[0] == sub.get('mtime') and prev[1]: continue
+            conn.execute('INSERT OR IGNORE INTO catalog_queue (url, type, parent, depth, mtime, quiet) VALUES (?, ?, ?, ?, ?, ?)',
+                         (sub['url'], type_key, url, depth + 1, sub.get('mtime'), int(quiet)))
+
+    # mtime is what the parent listing reported, i.e. what the next crawl compares against
+    conn.execute('INSERT OR REPLACE INTO catalog_dirs (url, type, parent, mtime, leaf, unlisted) VALUES (?, ?, ?, ?, ?, 0)',
+                 (url, type_key, parent, mtime, 0 if subdirs else 1))
+    return added, removed
+
+def _log_changes(conn, type_key, action, files):
+    now = int(time.time())
+    conn.executemany('INSERT INTO catalog_changes (time, type, action, name, url) VALUES (?, ?, ?, ?, ?)',
+                     [(now, type_key, action, name, url) for name, url in files])
+
+def crawl_catalog(type_key, progress=None, workers=MAX_THREADS):
+    """
+    Brings type_key's part of the index up to date. The first crawl lists every
+    folder; later ones only list folders whose mtime changed (see _apply_listing)
+    and log added/removed files to catalog_changes. Pending folders are kept in
+    catalog_queue, so a cancelled crawl resumes where it stopped.
+    progress(folders, files) is called after each folder; returning False cancels.
+    Returns {'files', 'added', 'removed'}, or None if cancelled.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    categories = MOVIE_CATEGORIES if type_key == 'movies' else SERIES_CATEGORIES
+    conn = open_catalog()
+    try:
+        seeding_key = f'seeding_{type_key}'
+        if conn.execute('SELECT 1 FROM catalog_queue WHERE type = ? LIMIT 1', (type_key,)).fetchone():
+            seeding = conn.execute('SELECT 1 FROM catalog_meta WHERE key = ?', (seeding_key,)).fetchone() is not None
+        else:
+            # No folder state yet (first crawl, or an index from before it was
+            # tracked): start from scratch and don't report everything as new
+            seeding = not conn.execute('SELECT 1 FROM catalog_dirs WHERE type = ? LIMIT 1', (type_key,)).fetchone()
+            with conn:
+                if seeding:
+                    conn.execute('DELETE FROM files_fts WHERE rowid IN (SELECT id FROM files WHERE type = ?)', (type_key,))
+                    conn.execute('DELETE FROM files WHERE type = ?', (type_key,))
+                    conn.execute('DELETE FROM catalog_meta WHERE key = ?', (f'built_at_{type_key}',))
+                    conn.execute('INSERT OR REPLACE INTO catalog_meta (key, value) VALUES (?, ?)', (seeding_key, '1'))
+                for _, url in categories:
+                    conn.execute('INSERT OR IGNORE INTO catalog_queue (url, type, parent, depth, mtime) VALUES (?, ?, NULL, 0, NULL)', (url, type_key))
+
+        folders_done = 0
+        files_found = 0
+        added_total = removed_total = 0
+        crawl = in_lane(_crawl_folder, LANE_BACKGROUND)
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            while True:
+                # Committed in batches: a commit per folder is dominated by fsync
+                batch = conn.execute('SELECT q.url, q.parent, q.depth, q.mtime, COALESCE(q.quiet, 0) OR COALESCE(d.unlisted, 0), '
+                                     'd.mtime, d.leaf FROM catalog_queue q LEFT JOIN catalog_dirs d ON d.url = q.url '
+                                     'WHERE q.type = ? ORDER BY q.depth, q.rowid LIMIT 50', (type_key,)).fetchall()
+                if not batch: break
+                listed = ex.map(lambda row: crawl(row[0], row[3], row[5], row[6]), batch)
+                for (url, parent, depth, _, quiet, _, _), result in zip(batch, listed):
+                    conn.execute('DELETE FROM catalog_queue WHERE url = ?', (url,))
+                    quiet = seeding or quiet
+                    if result is None:
+                        # Unchanged leaf: its files and state stay as they are
+                        pass
+                    elif result[1] is None:
+                        # An unreadable folder keeps its old state and is retried next
+                        # crawl. One never listed before is remembered as such, or all
+                        # of its files would be reported as new once it is.
+                        if quiet:
+                            conn.execute('INSERT OR IGNORE INTO catalog_dirs (url, type, parent, mtime, leaf, unlisted) VALUES (?, ?, ?, NULL, 1, 1)',
+                                         (url, type_key, parent))
+                    else:
+                        mtime, items = result
+                        added, removed = _apply_listing(conn, type_key, url, parent, depth, mtime, items, quiet)
+                        if not quiet:
+                            _log_changes(conn, type_key, 'added', added)
+                            _log_changes(conn, type_key, 'removed', removed)
+                            added_total += len(added)
+                            removed_total += len(removed)
+                        files_found += sum(1 for i in items if i['url'].lower().endswith(('.mkv', '.mp4')))
+                    folders_done += 1
+                    if progress and not progress(folders_done, files_found):
+                        conn.commit()
+                        return None
+                conn.commit()
+
+        with conn:
+            conn.execute('INSERT OR REPLACE INTO catalog_meta (key, value) VALUES (?, ?)', (f'built_at_{type_key}', str(time.time())))
+            conn.execute('DELETE FROM catalog_meta WHERE key = ?', (seeding_key,))
+            conn.execute('DELETE FROM catalog_changes WHERE rowid <= (SELECT MAX(rowid) FROM catalog_changes) - ?', (CATALOG_CHANGES_KEEP,))
+        total = conn.execute('SELECT COUNT(*) FROM files WHERE type = ?', (type_key,)).fetchone()[0]
+        xbmc.log(f"DhakaFlix: {type_key} index updated, {folders_done} folders listed, "
+                 f"{added_total} added, {removed_total} removed", xbmc.LOGINFO)
+        return {'files': total, 'added': added_total, 'removed': removed_total}
+    finally:
+        conn.close()
+
+def _fts_query(term):
+    # Prefix-match words, but not numbers: "1*" would also hit every 19xx year
+    words = re.findall(r'\w+', term.lower())
+    return ' '.join(w if w.isdigit() else f'{w}*' for w in words)
+
+def _catalog_built_at(conn, type_key):
+    row = conn.execute('SELECT value FROM catalog_meta WHERE key = ?', (f'built_at_{type_key}',)).fetchone()
+    return float(row[0]) if row else None
+
+def catalog_status(type_key):
+    """(time type_key's part of the index was last completed or None, whether a crawl is pending)"""
+    if not os.path.exists(CATALOG_DB): return None, False
+    try:
+        conn = open_catalog()
+        try:
+            pending = conn.execute('SELECT 1 FROM catalog_queue WHERE type = ? LIMIT 1', (type_key,)).fetchone() is not None
+            return _catalog_built_at(conn, type_key), pending
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return None, False
+
+def recently_added(limit=200):
+    """Files the last crawls found new, newest first, in execute_single_search() format; None without an index"""
+    if not os.path.exists(CATALOG_DB): return None
+    try:
+        conn = open_catalog()
+        try:
+            rows = conn.execute(
+                'SELECT f.name, f.url, f.size, f.meta, f.parser FROM catalog_changes c JOIN files f ON f.url = c.url '
+                'WHERE c.action = ? ORDER BY c.rowid DESC LIMIT ?', ('added', limit)
+            ).fetchall()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return None
+    results = []
+    for name, url, size, meta, parser in rows:
+        if meta and parser == PARSER_VERSION: remember_release(name, json.loads(meta))
+        results.append({'href': urlparse(url).path, 'fullUrl': url, 'label': name, 'size': size})
+    return results
+
+def search_catalog(type_key, query, limit=500):
+    """Returns index hits in execute_single_search() format, or None if the index is missing or stale"""
+    if not os.path.exists(CATALOG_DB): return None
+    try:
+        conn = open_catalog()
+        try:
+            built_at = _catalog_built_at(conn, type_key)
+            max_age = get_setting_int('catalog_max_age', 7) * 86400
+            if built_at is None or time.time() - built_at > max_age: return None
+
+            for term in get_smart_search_terms(query):
+                match = _fts_query(term)
+                if not match: continue
+                rows = conn.execute(
+                    'SELECT f.name, f.url, f.size, f.meta, f.parser FROM files_fts JOIN files f ON f.id = files_fts.rowid '
+                    'WHERE files_fts MATCH ? AND f.type = ? LIMIT ?',
+                    (match, type_key, limit)
+                ).fetchall()
+                if rows:
+                    results = []
+                    for name, url, size, meta, parser in rows:
+                        if meta and parser == PARSER_VERSION: remember_release(name, json.loads(meta))
+                        results.append({'href': urlparse(url).path, 'fullUrl': url, 'label': name, 'size': size})
+                    return results
+            return []
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return None
+
+def build_catalog():
+    pDialog = xbmcgui.DialogProgress()
+    pDialog.create('DhakaFlix', 'Building search index...')
+    total = added = 0
+    for step, type_key in enumerate(('movies', 'series')):
+        def progress(folders, files):
+            pDialog.update(step * 50 + (folders % 50), f'{type_key.title()}: {folders} folders, {files} files')
+            return not pDialog.iscanceled()
+
+        result = crawl_catalog(type_key, progress)
+        if result is None:
+            pDialog.close()
+            xbmcgui.Dialog().notification('DhakaFlix', 'Indexing paused, run it again to continue', xbmcgui.NOTIFICATION_INFO)
+            return
+        total += result['files']
+        added += result['added']
+    pDialog.close()
+    xbmcgui.Dialog().notification('DhakaFlix', f'Indexed {total} files ({added} new)', xbmcgui.NOTIFICATION_INFO)
+
+def search_runner(type_key, query):
+    # The local index answers in milliseconds; servers are only asked when it
+    # is missing, stale or has nothing for this query.
+    t = time.perf_counter()
+    local_results = search_catalog(type_key, query)
+    perf_add('search.catalog', t)
+    if local_results: return local_results
+
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    servers = SEARCH_SERVERS.get(type_key, [])
+    terms = get_smart_search_terms(query)
+    if not servers or not terms: return []
+
+    # Every term x server request starts at once. A term wins as soon as all of
+    # its servers have answered with results and every higher-priority term has
+    # come back empty; whatever is still queued is then dropped.
+    t = time.perf_counter()
+    pending = [len(servers)] * len(terms)
+    term_results = [[] for _ in terms]
+    ex = ThreadPoolExecutor(max_workers=len(terms) * len(servers))
+    futures = {ex.submit(execute_single_search, term, srv): i for i, term in enumerate(terms) for srv in servers}
+    all_results = []
+    try:
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                res = future.result()
+                if res: term_results[i].extend(res)
+            except: pass
+            pending[i] -= 1
+
+            for j in range(len(terms)):
+                if pending[j]: break
+                if term_results[j]:
+                    all_results = term_results[j]
+                    break
+            if all_results: break
+    finally:
+        for f in futures: f.cancel()
+        ex.shutdown(wait=False)
+        perf_add('search.live', t)
+            
+    return all_results
+
+def search_input(type_key):
+    kb = xbmc.Keyboard('', f'Search {type_key.title()}')
+    kb.doModal()
+    # This folder never opens; the results get a URL of their own instead, so
+    # Back (or returning from the player) reopens them from the search cache
+    # rather than popping up the keyboard again
+    xbmcplugin.endOfDirectory(HANDLE, succeeded=False)
+    if kb.isConfirmed() and kb.getText():
+        xbmc.executebuiltin(f"Container.Update({search_url(type_key, kb.getText())})")
+
+def download_context_item(url, title, mirrors=(), size=None):
+    """Context menu entry that queues url for download (see downloads.py)"""
+    query = f"mode=download&url={quote(url)}&title={quote(title)}"
+    if mirrors: query += f"&mirrors={quote('|'.join(mirrors))}"
+    if size: query += f"&size={size}"
+    return ('Download', f'RunPlugin({build_url(query)})')
+
+def search_url(type_key, query):
+    return build_url(f"mode=search&type={type_key}&query={quote(query)}")
+
+# --- RECENT SEARCHES ---
+# Every search is remembered in history.db with what it returned. Opening the
+# same search again within search_cache_ttl (Back, a Recent Searches entry)
+# is answered from there instead of asking every server again.
+
+def normalize_query(query):
+    """Queries that would search for the same terms share one cache entry"""
+    cleaned = re.sub(r'[:\-–—]', ' ', query)
+    return re.sub(r'\s+', ' ', cleaned).strip().lower()
+
+def load_cached_search(type_key, query):
+    """Stored results of an earlier identical search, or None if there are none fresh enough"""
+    key = (type_key, normalize_query(query))
+    try:
+        conn = open_history()
+        try:
+            row = conn.execute('SELECT results, results_time FROM searches WHERE type = ? AND norm = ?', key).fetchone()
+            if not row or row[0] is None: return None
+            if time.time() - row[1] > get_setting_int('search_cache_ttl', 30) * 60: return None
+            results = json.loads(row[0])
+            # Reopened searches move to the top of Recent Searches
+            with conn:
+                conn.execute('UPDATE searches SET time = ? WHERE type = ? AND norm = ?', (int(time.time()),) + key)
+            return results
+        finally:
+            conn.close()
+    except (sqlite3.Error, ValueError):
+        return None
+
+def save_search(type_key, query, results):
+    """Records the search for Recent Searches; results are only kept when there were any"""
+    now = int(time.time())
+    keep = max(1, get_setting_int('search_history_size', 20))
+    try:
+        conn = open_history()
+        try:
+            with conn:
+                conn.execute('INSERT OR REPLACE INTO searches (type, norm, query, time, results, results_time) VALUES (?, ?, ?, ?, ?, ?)',
+                             (type_key, normalize_query(query), query, now,
+                              json.dumps(results, separators=(',', ':')) if results else None, now if results else None))
+                conn.execute('DELETE FROM searches WHERE rowid NOT IN (SELECT rowid FROM searches ORDER BY time DESC LIMIT ?)', (keep,))
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        xbmc.log('DhakaFlix: could not save search', xbmc.LOGWARNING)
+
+def load_recent_searches():
+    try:
+        conn = open_history()
+        try:
+            return conn.execute('SELECT type, query, time FROM searches ORDER BY time DESC').fetchall()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return []
+
+def recent_searches_menu():
+    searches = load_recent_searches()
+    if not searches:
+        li = xbmcgui.ListItem("No Recent Searches")
+        xbmcplugin.addDirectoryItem(HANDLE, "", li, isFolder=False)
+    else:
+        li = xbmcgui.ListItem("[COLOR red]Clear Recent Searches[/COLOR]")
+        li.setArt({'icon': 'DefaultAddon.png', 'thumb': 'DefaultAddon.png'})
+        xbmcplugin.addDirectoryItem(HANDLE, build_url("mode=clear_searches"), li, isFolder=False)
+
+        for type_key, query, searched in searches:
+            kind = 'Movies' if type_key == 'movies' else 'TV Series'
+            li = xbmcgui.ListItem(f"{query} [COLOR grey]({kind}, {time.strftime('%d %b %H:%M', time.localtime(searched))})[/COLOR]")
+            li.setArt({'icon': 'DefaultAddonsSearch.png'})
+            xbmcplugin.addDirectoryItem(HANDLE, search_url(type_key, query), li, isFolder=True)
+    xbmcplugin.endOfDirectory(HANDLE)
+
+def clear_searches():
+    try:
+        conn = open_history()
+        try:
+            with conn:
+                conn.execute('DELETE FROM searches')
+        finally:
+            conn.close()
+        xbmc.executebuiltin('Container.Refresh')
+    except sqlite3.Error:
+        xbmcgui.Dialog().notification('DhakaFlix', 'Error Clearing Searches', xbmcgui.NOTIFICATION_ERROR)
+
+# --- MIRRORS ---
+# The same release is often on more than one server (DHAKA-FLIX-7 and -14, say).
+# Search results are grouped into one item per release, and at play time the
+# mirror that delivers a small ranged read first is the one handed to Kodi.
+
+MIRROR_PROBE_BYTES = 256 * 1024
+MIRROR_PROBE_TIMEOUT = 4
+
+def _release_key(result):
+    meta = parse_release(result['label'])
+    return (_normalize_name(meta['title'] or ''), meta['year'], meta['quality'],
+            meta['season'], meta['episode'], result.get('size'))
+
+def group_mirrors(results):
+    """[(result, [urls])] with one entry per release, in first-seen order"""
+    groups = OrderedDict()
+    for r in results:
+        key = _release_key(r)
+        if key not in groups:
+            groups[key] = (r, [r['fullUrl']])
+        elif r['fullUrl'] not in groups[key][1]:
+            groups[key][1].append(r['fullUrl'])
+    return list(groups.values())
+
+def _probe_mirror(url):
+    """Seconds to read the first MIRROR_PROBE_BYTES of url, or None if it failed"""
+    start = time.time()
+    try:
+        r = http_request('GET', url, headers={'Range': f'bytes=0-{MIRROR_PROBE_BYTES - 1}'}, stream=True)
+        try:
+            if r.status_code not in (200, 206): return None
+            received = 0
+            for chunk in r.iter_content(64 * 1024):
+                received += len(chunk)
+                if received >= MIRROR_PROBE_BYTES: break
+        finally:
+            r.close()
+    except:
+        return None
+    return time.time() - start
+
+def pick_mirror(urls):
+    """
+    Probes all mirrors at once; the first to finish its ranged read has the best
+    mix of latency and throughput right now. Falls back to the first url when
+    no probe completes in time.
+    """
+    candidates = [u for u in urls if host_available(urlparse(u).netloc)]
+    if len(candidates) < 2: return candidates[0] if candidates else urls[0]
+
+    from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+    ex = ThreadPoolExecutor(max_workers=len(candidates))
+    futures = {ex.submit(_probe_mirror, u): u for u in candidates}
+    best = candidates[0]
+    try:
+        for f in as_completed(futures, timeout=MIRROR_PROBE_TIMEOUT):
+            if f.result() is not None:
+                best = futures[f]
+                break
+    except FuturesTimeout:
+        pass
+    # Slower probes finish in the background; playback does not wait for them
+    ex.shutdown(wait=False)
+    return best
+
+def display_search_results(type_key, query):
+    t = time.perf_counter()
+    results = load_cached_search(type_key, query)
+    perf_add('search.cache', t)
+    if results:
+        add_result_items(results)
+        xbmcplugin.endOfDirectory(HANDLE)
+        return
+
+    pDialog = xbmcgui.DialogProgress()
+    pDialog.create('DhakaFlix', f'Searching {type_key}...')
+    
+    with shared_fetch(f"search:{type_key}:{normalize_query(query)}") as owner:
+        # The same search may have just finished in another invocation
+        results = None if owner else load_cached_search(type_key, query)
+        if results is None:
+            results = search_runner(type_key, query)
+            save_search(type_key, query, results)
+    
+    if not results:
+        pDialog.close()
+        li = xbmcgui.ListItem("No results found")
+        xbmcplugin.addDirectoryItem(HANDLE, "", li, isFolder=False)
+        xbmcplugin.endOfDirectory(HANDLE)
+        return
+
+    pDialog.update(100, "Processing results...")
+    t = time.perf_counter()
+    add_result_items(results)
+    perf_add('search.items', t)
+        
+    pDialog.close()
+    xbmcplugin.endOfDirectory(HANDLE)
+
+def add_result_items(results):
+    """Playable items for search-style results, one per release"""
+    for item, mirrors in group_mirrors(results):
+        title, year = extract_meta(item['label'])
+        quality = extract_quality(item['label'])
+        
+        display_title = f"{title}"
+        if year: display_title += f" ({year})"
+        display_title += f" - [COLOR yellow]{quality}[/COLOR]"
+        if len(mirrors) > 1: display_title += f" [COLOR grey]({len(mirrors)} servers)[/COLOR]"
+        
+        li = xbmcgui.ListItem(display_title)
+        video_info = {'title': title, 'mediatype': 'video'}
+        if year: video_info['year'] = year
+        
+        li.setInfo('video', video_info)
+        li.setArt({'icon': 'DefaultVideo.png'})
+        li.setProperty('IsPlayable', 'true')
+        li.addContextMenuItems([download_context_item(item['fullUrl'], title, mirrors[1:], item.get('size'))])
+        
+        url = f"mode=play&url={quote(item['fullUrl'])}&title={quote(title)}&icon=DefaultVideo.png"
+        if len(mirrors) > 1: url += f"&mirrors={quote('|'.join(mirrors[1:]))}"
+        xbmcplugin.addDirectoryItem(HANDLE, build_url(url), li, isFolder=False)
+
+def recently_added_menu():
+    results = recently_added()
+    if not results:
+        msg = "Nothing new since the last index update" if results is not None else "Build the offline search index first (addon settings)"
+        xbmcplugin.addDirectoryItem(HANDLE, "", xbmcgui.ListItem(msg), isFolder=False)
+    else:
+        add_result_items(results)
+    xbmcplugin.endOfDirectory(HANDLE)
+
+# --- KODI MENUS ---
+
+def _letter_key(label):
+    for ch in label:
+        if ch.isalpha(): return ch.upper()
+        if ch.isdigit(): return '#'
+    return '#'
+
+def _year_key(label):
+    match = YEAR_RE.search(label)
+    return match.group(1) if match else None
+
+def _file_info(item, info):
+    """Adds size/date from the h5ai API to a setInfo dict when the listing has them"""
+    if item.get('size'): info['size'] = item['size']
+    if item.get('mtime'):
+        info['dateadded'] = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(item['mtime']))
+        info['date'] = time.strftime('%d.%m.%Y', time.localtime(item['mtime']))
+    return info
+
+def _is_listed(item):
+    return item['is_folder'] or item['url'].split('.')[-1].lower() in ['mkv', 'mp4']
+
+def browse_url(url, **params):
+    query = f"mode=browse&url={quote(url)}"
+    for key, value in params.items():
+        if value: query += f"&{key}={quote(str(value))}"
+    return build_url(query)
+
+def browse_jump(url, by):
+    """Lists the letters or years present in a directory, each opening a filtered browse"""
+    items = [i for i in fetch_links(url) if _is_listed(i)]
+    key_func = _letter_key if by == 'letter' else _year_key
+    counts = {}
+    for item in items:
+        key = key_func(item['label'])
+        if key: counts[key] = counts.get(key, 0) + 1
+
+    keys = sorted(counts, reverse=(by == 'year'))
+    for key in keys:
+        li = xbmcgui.ListItem(f"{key} ({counts[key]})")
+        li.setArt({'icon': 'DefaultFolder.png'})
+        xbmcplugin.addDirectoryItem(HANDLE, browse_url(url, **{by: key}), li, isFolder=True)
+    xbmcplugin.endOfDirectory(HANDLE)
+
+def cached_folder_art(folders):
+    """
+    Splits folders by what the art cache knows: returns ({folder url: image url}
+    for cached art, folders never checked, folders whose entry has expired).
+    """
+    folder_images = {}
+    art_cache = load_art_cache()
+    now = time.time()
+    unknown, stale = [], []
+    for f in folders:
+        entry = art_cache.get(f['url'])
+        if entry is None:
+            unknown.append(f)
+            continue
+        if entry.get('art'): folder_images[f['url']] = entry['art']
+        if not is_art_entry_fresh(entry, now): stale.append(f)
+    return folder_images, unknown, stale
+
+def scan_folder_art(folders, budget, workers=MAX_THREADS, on_progress=None):
+    """
+    Scrapes folders for art until `budget` seconds run out and returns
+    {folder url: image url} for the ones that have it. Each scan goes through
+    fetch_links(), so the child's whole listing is cached too and opening that
+    folder next needs no request. on_progress(done, total) runs before the
+    scan and after each folder; returning False stops it.
+    """
+    folder_images = {}
+    if not folders: return folder_images
+    if on_progress: on_progress(0, len(folders))
+
+    from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+    def check_art(item):
+        return (item['url'], find_folder_image(fetch_links(item['url'], prune=False)))
+    check_art = in_lane(check_art, LANE_ART)
+
+    updates = {}
+    ex = ThreadPoolExecutor(max_workers=workers)
+    futures = [ex.submit(check_art, f) for f in folders]
+    try:
+        for i, f in enumerate(as_completed(futures, timeout=budget)):
+            try:
+                u, img = f.result()
+                updates[u] = {'art': img, 'time': int(time.time())}
+                if img: folder_images[u] = img
+            except: pass
+            if on_progress and not on_progress(i + 1, len(folders)): break
+    except FuturesTimeout:
+        pass
+    # Whatever did not finish in time is picked up on a later visit
+    for f in futures: f.cancel()
+    ex.shutdown(wait=False)
+    save_art_cache(updates)
+    prune_listing_cache()
+    return folder_images
+
+def resolve_folder_art(folders, budget, workers=MAX_THREADS, on_progress=None):
+    """
+    Returns {folder url: image url} for the folders that have art. Cached art
+    is used as-is; unknown (first) and stale folders are scraped (see scan_folder_art).
+    """
+    folder_images, unknown, stale = cached_folder_art(folders)
+    folder_images.update(scan_folder_art(unknown + stale, budget, workers, on_progress))
+    return folder_images
+
+def browse(url, page=1, letter=None, year=None):
+    pDialog = xbmcgui.DialogProgress()
+    pDialog.create('DhakaFlix', 'Scraping directory...')
+    is_wrestling = 'WWE%20%26%20AEW%20Wrestling' in url or 'WWE & AEW Wrestling' in unquote(url)
+
+    t = time.perf_counter()
+    items = fetch_links(url)
+    perf_add('browse.fetch', t)
+    if not items:
+        pDialog.close()
+        xbmcplugin.endOfDirectory(HANDLE)
+        return
+
+    items.sort(key=lambda x: (not x['is_folder'], natural_key(x['label'])))
+
+    local_poster = None
+    local_subs = []
+    for item in items:
+        if not item['is_folder']:
+            if item['label'].lower().endswith(IMAGE_EXTS):
+                if not local_poster: local_poster = item['url']
+            if item['url'].lower().endswith(SUBTITLE_EXTS):
+                local_subs.append(item)
+    sub_index = build_subtitle_index(local_subs)
+
+    # Only one page of folders/videos is built (and art-scanned) per invocation;
+    # later pages come out of the same cached listing.
+    listed = [i for i in items if _is_listed(i)]
+    if letter: listed = [i for i in listed if _letter_key(i['label']) == letter]
+    if year: listed = [i for i in listed if _year_key(i['label']) == year]
+
+    page_size = get_setting_int('browse_page_size', 200)
+    total_pages = 1
+    if page_size > 0 and len(listed) > page_size:
+        total_pages = (len(listed) + page_size - 1) // page_size
+        page = max(1, min(page, total_pages))
+        listed = listed[(page - 1) * page_size:page * page_size]
+
+    if total_pages > 1 and page == 1 and not letter and not year:
+        for label, by in (("[COLOR yellow]Jump to letter...[/COLOR]", 'letter'), ("[COLOR yellow]Jump to year...[/COLOR]", 'year')):
+            li = xbmcgui.ListItem(label)
+            li.setArt({'icon': 'DefaultFolder.png'})
+            xbmcplugin.addDirectoryItem(HANDLE, build_url(f"mode=browse_jump&url={quote(url)}&by={by}"), li, isFolder=True)
+
+    folders = [i for i in listed if i['is_folder']]
+    
+    t = time.perf_counter()
+    folder_images, stale_art = {}, []
+    if folders:
+        def art_progress(done, total):
+            if done == 0: pDialog.update(10, 'Scanning folders...')
+            else: pDialog.update(int(10 + ((done - 1) / total * 80)))
+            return not pDialog.iscanceled()
+        # Only folders never checked hold the listing up; stale entries still
+        # have art to show and are re-checked once Kodi is showing it
+        folder_images, unknown, stale_art = cached_folder_art(folders)
+        folder_images.update(scan_folder_art(unknown, get_setting_int('art_scan_budget', 10), on_progress=art_progress))
+    perf_add('browse.art', t)
+
+    t = time.perf_counter()
+    for item in listed:
+        if pDialog.iscanceled(): break
+        ext = item['url'].split('.')[-1].lower()
+        
+        if item['is_folder']:
+            li = xbmcgui.ListItem(item['label'])
+            li.setInfo('video', _file_info(item, {'title': item['label'], 'mediatype': 'video'}))
+            art = folder_images.get(item['url'])
+            if art: li.setArt({'poster': art, 'thumb': art, 'fanart': art})
+            else: li.setArt({'icon': 'DefaultFolder.png'})
+            xbmcplugin.addDirectoryItem(HANDLE, browse_url(item['url']), li, isFolder=True)
+            
+        elif ext in ['mkv', 'mp4']:
+            if is_wrestling:
+                title, file_year = unquote(item['label']), None
+            else:
+                title, file_year = item_meta(item)
+            
+            li = xbmcgui.ListItem(title)
+            info = _file_info(item, {'title': title, 'mediatype': 'video'})
+            if file_year: info['year'] = file_year
+            li.setInfo('video', info)
+            
+            icon_url = 'DefaultVideo.png'
+            if local_poster: 
+                icon_url = local_poster
+                li.setArt({'poster': local_poster, 'thumb': local_poster, 'fanart': local_poster})
+            else: 
+                li.setArt({'icon': 'DefaultVideo.png'})
+            
+            subs = match_subtitles(sub_index, item['label'])
+            if subs: li.setSubtitles(subs)
+            
+            li.setProperty('IsPlayable', 'true')
+            li.addContextMenuItems([download_context_item(item['url'], title, size=item.get('size'))])
+            
+            xbmcplugin.addDirectoryItem(HANDLE, play_url(item['url'], title, icon_url), li, isFolder=False)
+
+    if page < total_pages:
+        li = xbmcgui.ListItem(f"[COLOR yellow]Next page ({page + 1}/{total_pages})[/COLOR]")
+        li.setArt({'icon': 'DefaultFolder.png'})
+        xbmcplugin.addDirectoryItem(HANDLE, browse_url(url, page=page + 1, letter=letter, year=year), li, isFolder=True)
+    perf_add('browse.items', t)
+            
+    pDialog.close()
+    t = time.perf_counter()
+    xbmcplugin.setContent(HANDLE, 'movies')
+    xbmcplugin.endOfDirectory(HANDLE)
+    perf_add('browse.end', t)
+
+    if stale_art:
+        t = time.perf_counter()
+        with request_lane(LANE_BACKGROUND):
+            scan_folder_art(stale_art, get_setting_int('art_scan_budget', 10))
+        perf_add('browse.art_recheck', t)
+
+    if get_setting_bool('prefetch_next', True):
+        t = time.perf_counter()
+        prefetch_listings(url, items, folders)
+        perf_add('browse.prefetch', t)
+
+def prefetch_targets(url, items, folders):
+    """Guesses which folder the user opens next"""
+    if len(folders) == 1:
+        # Show -> single season, season -> single part, ...
+        return [folders[0]['url']]
+    if folders or not any(VIDEO_EXT_RE.search(i['url']) for i in items):
+        return []
+    # A folder of episodes: the next season is the sibling after this one
+    parent = load_cached_listing(urljoin(url, '..'))
+    if not parent: return []
+    siblings = [i['url'] for i in season_folders(parent['items'])]
+    if url in siblings:
+        pos = siblings.index(url)
+        if pos + 1 < len(siblings): return [siblings[pos + 1]]
+    return []
+
+def prefetch_listings(url, items, folders):
+    """Runs after endOfDirectory(), so Kodi is already showing the folder"""
+    with request_lane(LANE_BACKGROUND):
+        for target in prefetch_targets(url, items, folders):
+            try:
+                fetch_links(target)
+            except:
+                pass
+
+# --- SERIES INDEX ---
+# Shows are modelled from the listing cache as show -> seasons -> episodes,
+# ordered by their S01E02 / 1x02 tags (natural name order where there are
+# none), with a pointer from every episode to the one after it. Nothing is
+# stored besides the listings, so the model can't disagree with them, and
+# building it is a few cached-file reads. play_video() uses it to queue the
+# next episode without scraping anything.
+
+NATURAL_SPLIT_RE = re.compile(r'(\d+)')
+SEASON_FOLDER_RE = re.compile(r'^\s*(?:season|series)[ ._-]*(\d{1,3})\b|^\s*s(\d{1,3})\b', re.IGNORECASE)
+NEXT_WARM_SECONDS = 60  # the next episode's first bytes are read when this much is left
+PLAYBACK_END_SLACK = 5  # stopping closer to the end than this counts as playing to the end
+
+def natural_key(label):
+    """Sort key that puts 'Episode 2' before 'Episode 10'"""
+    return [int(part) if part.isdigit() else part for part in NATURAL_SPLIT_RE.split(label.lower())]
+
+def season_number(label):
+    match = SEASON_FOLDER_RE.search(unquote(label))
+    return int(match.group(1) or match.group(2)) if match else None
+
+def season_folders(items):
+    """Season folders of a show listing in season order; every folder if none is named like one"""
+    folders = [i for i in items if i['is_folder']]
+    seasons = [(season_number(i['label']), i) for i in folders]
+    if any(n is not None for n, _ in seasons):
+        return [i for n, i in sorted((s for s in seasons if s[0] is not None), key=lambda s: (s[0], natural_key(s[1]['label'])))]
+    return sorted(folders, key=lambda i: natural_key(i['label']))
+
+def episode_list(items):
+    """Videos of one listing in play order"""
+    def key(item):
+        tag = episode_tag(unquote(item['label']))
+        return ((0, tag) if tag else (1, ()), natural_key(item['label']))
+    return sorted((i for i in items if not i['is_folder'] and VIDEO_EXT_RE.search(i['url'])), key=key)
+
+def _same_episode(a, b):
+    tag = episode_tag(unquote(a['label']))
+    return tag is not None and tag == episode_tag(unquote(b['label']))
+
+def series_index(folder_url, fetch=False):
+    """
+    {'show', 'seasons', 'episodes', 'next'} for the show folder_url belongs to;
+    folder_url is the show itself when its episodes aren't split into seasons.
+    'next' maps each episode url to the item after it. Only cached listings are
+    read unless fetch is set, which lists the folder, its show and the season
+    after it where they aren't fresh. None without a listing of folder_url.
+    """
+    def listing(url, needed=False):
+        if fetch and needed: return fetch_links(url) or None
+        cached = load_cached_listing(url)
+        return cached['items'] if cached else None
+
+    if listing(folder_url, True) is None: return None
+    show, seasons = folder_url, [folder_url]
+    if season_number(folder_url.rstrip('/').rsplit('/', 1)[-1]) is not None:
+        parent = urljoin(folder_url, '..')
+        show_items = listing(parent, True)
+        if show_items:
+            show = parent
+            seasons = [i['url'] for i in season_folders(show_items)] or seasons
+            if folder_url not in seasons: seasons = [folder_url]
+
+    episodes = []
+    current = seasons.index(folder_url)
+    for pos, season in enumerate(seasons):
+        items = listing(season, pos == current + 1)
+        if items is None:
+            # A gap after the current season would make its last episode point past the next one
+            if pos > current: break
+            continue
+        episodes.extend(episode_list(items))
+
+    # Copies of one episode (720p and 1080p, say) all point at the episode after
+    # them; of its copies, the one in the same resolution is preferred
+    nexts = {}
+    start = 0
+    while start < len(episodes):
+        end = start + 1
+        while end < len(episodes) and _same_episode(episodes[start], episodes[end]): end += 1
+        group_end = end + 1
+        while group_end < len(episodes) and _same_episode(episodes[end], episodes[group_end]): group_end += 1
+        following = episodes[end:group_end]
+        for ep in episodes[start:end]:
+            if not following: break
+            resolution = parse_release(ep['label'])['resolution']
+            nexts[ep['url']] = next((f for f in following if parse_release(f['label'])['resolution'] == resolution), following[0])
+        start = end
+    return {'show': show, 'seasons': seasons, 'episodes': episodes, 'next': nexts}
+
+def next_episode(url, fetch=False):
+    """The listing item of the episode after url, or None"""
+    index = series_index(urljoin(url, '.'), fetch)
+    return index['next'].get(url) if index else None
+
+def play_url(url, title, icon=''):
+    return build_url(f"mode=play&url={quote(url)}&title={quote(title)}&icon={quote(icon)}")
+
+def _play_target(path):
+    # The video behind a playlist entry: our play URLs carry it as a parameter
+    if not path.startswith(BASE_URL): return path
+    return dict(parse_qsl(urlparse(path).query)).get('url')
+
+def queue_next_episode(url, icon=''):
+    """
+    Adds the episode after url to Kodi's video playlist and returns the path it
+    queued, or None when url isn't followed by another episode
+    """
+    # Only episodes: the videos of a movie folder have no order worth following
+    folder = urljoin(url, '.')
+    if episode_tag(unquote(url)) is None and season_number(folder.rstrip('/').rsplit('/', 1)[-1]) is None: return None
+    ep = next_episode(url)
+    if ep is None:
+        # Played from search or history, or the next season isn't cached yet
+        with request_lane(LANE_BACKGROUND):
+            ep = next_episode(url, fetch=True)
+    if ep is None: return None
+
+    title = item_meta(ep)[0]
+    path = play_url(ep['url'], title, icon)
+    playlist = xbmc.PlayList(xbmc.PLAYLIST_VIDEO)
+    queued = [_play_target(playlist[i].getPath()) for i in range(playlist.size())]
+    if ep['url'] in queued: return path
+    if url not in queued:
+        # Not playing from the playlist: whatever is left in it is from earlier
+        playlist.clear()
+    li = xbmcgui.ListItem(title)
+    li.setInfo('video', _file_info(ep, {'title': title, 'mediatype': 'video'}))
+    if icon: li.setArt({'poster': icon, 'thumb': icon, 'fanart': icon})
+    li.setProperty('IsPlayable', 'true')
+    playlist.add(path, li)
+    return path
+
+def warm_episode(path):
+    """Near the end of an episode: reads the next one's first bytes (waking the
+    server and its disk cache) and lists what the one after it needs"""
+    url = _play_target(path)
+    with request_lane(LANE_BACKGROUND):
+        _probe_mirror(url)
+        try:
+            next_episode(url, fetch=True)
+        except:
+            pass
+
+def continue_playlist(path):
+    """Starts the queued episode when Kodi didn't move on by itself, which it
+    only does when playback was started from the playlist"""
+    player = xbmc.Player()
+    monitor = xbmc.Monitor()
+    for _ in range(3):
+        if player.isPlaying(): return
+        if monitor.waitForAbort(1): return
+    playlist = xbmc.PlayList(xbmc.PLAYLIST_VIDEO)
+    for i in range(playlist.size()):
+        if playlist[i].getPath() == path:
+            player.play(playlist, startpos=i)
+            return
+
+def play_video(params):
+    url = params.get('url')
+    mirrors = [m for m in params.get('mirrors', '').split('|') if m]
+    # History and resume points are keyed by the requested url; Kodi is handed
+    # whatever copy plays best: a download, or the fastest mirror right now
+    source = url
+    if url and os.path.exists(DOWNLOADS_DB):
+        from resources.lib.downloads import local_copy
+        source = local_copy([url] + mirrors) or url
+    if url and mirrors and source == url:
+        t = time.perf_counter()
+        source = pick_mirror([url] + mirrors)
+        perf_add('play.mirror', t)
+    
+    t = time.perf_counter()
+    if url:
+        try:
+            title = params.get('title', 'Unknown')
+            icon = params.get('icon', '')
+            save_to_history(title, url, icon)
+        except:
+            pass 
+    perf_add('play.history', t)
+
+    t = time.perf_counter()
+    li = xbmcgui.ListItem(path=source)
+    xbmcplugin.setResolvedUrl(HANDLE, True, li)
+    perf_add('play.resolve', t)
+
+    upcoming = None
+    if url and get_setting_bool('queue_next', True):
+        t = time.perf_counter()
+        try:
+            upcoming = queue_next_episode(url, params.get('icon', ''))
+        except:
+            pass
+        perf_add('play.queue_next', t)
+
+    record = get_setting_bool('track_playback', True)
+    if url and (record or upcoming):
+        # Playback can run for hours; flush the record before waiting on it
+        perf_finish()
+        position, duration = track_playback(url, source if source != url else None, record,
+                                            upcoming and (lambda: warm_episode(upcoming)))
+        if upcoming and duration and duration - position < PLAYBACK_END_SLACK:
+            continue_playlist(upcoming)
+
+def router(paramstring):
+    params = dict(parse_qsl(paramstring))
+    mode = params.get('mode')
+    perf_start(mode)
+    
+    if mode is None:
+        main_menu()
+    elif mode == 'movies_root':
+        movies_menu()
+    elif mode == 'series_root':
+        series_menu()
+    elif mode == 'browse':
+        browse(params.get('url'), int(params.get('page', 1)), params.get('letter'), params.get('year'))
+    elif mode == 'browse_jump':
+        browse_jump(params.get('url'), params.get('by', 'letter'))
+    elif 'search_input' in str(mode):
+        type_key = params.get('type', 'movies')
+        search_input(type_key)
+    elif mode == 'search':
+        display_search_results(params.get('type', 'movies'), params.get('query', ''))
+    elif mode == 'recent_searches':
+        recent_searches_menu()
+    elif mode == 'clear_searches':
+        clear_searches()
+    elif mode == 'play':
+        play_video(params)
+    elif mode == 'history':
+        history_menu()
+    elif mode == 'clear_history': 
+        clear_history()
+    elif mode == 'clear_cache':
+        clear_cache()
+    elif mode == 'build_catalog':
+        build_catalog()
+    elif mode == 'diagnostics':
+        diagnostics_menu()
+    elif mode == 'probe_servers':
+        probe_servers()
+    elif mode == 'perf_stats':
+        perf_stats_menu()
+    elif mode == 'recently_added':
+        recently_added_menu()
+    elif mode == 'download':
+        from resources.lib.downloads import queue_download
+        queue_download(params)
+    elif mode == 'downloads':
+        from resources.lib.downloads import downloads_menu
+        downloads_menu()
+    elif mode == 'download_remove':
+        from resources.lib.downloads import remove_download
+        remove_download(params.get('url'))
+
+def finish_invocation():
+    save_health()
+    perf_finish()
@@ -0,0 +1,109 @@
+import time
+import threading
+import xbmc
+
+from resources.lib import plugin, downloads
+
+# Background refresh, started by Kodi at login (xbmc.service in addon.xml).
+# While Kodi is idle and nothing is playing it re-checks the servers, refreshes
+# the category listings before they expire, resolves first-page folder art and
+# picks up new files in the search index, so plugin invocations mostly find
+# warm data. Runs with few threads and a bandwidth cap, and stops as soon as
+# playback starts or the user becomes active.
+# Queued downloads run here too, in their own thread and regardless of idle
+# time: the user asked for them.
+
+STARTUP_DELAY = 60
+POLL_INTERVAL = 10
+RETRY_DELAY = 300
+
+class DhakaFlixService(xbmc.Monitor):
+    def __init__(self):
+        super().__init__()
+        self.player = xbmc.Player()
+        self.downloader = None
+        self.apply_settings()
+
+    def onNotification(self, sender, method, data):
+        # Sent by the plugin when it queues a download
+        if method.endswith(downloads.NOTIFY_MESSAGE): self.start_downloads()
+
+    def start_downloads(self):
+        if self.downloader and self.downloader.is_alive(): return
+        parallel = max(1, plugin.get_setting_int('download_parallel', 1))
+        self.downloader = threading.Thread(target=downloads.run_queue, args=(self.abortRequested, parallel), daemon=True)
+        self.downloader.start()
+
+    def onSettingsChanged(self):
+        plugin.reload_settings()
+        self.apply_settings()
+
+    def apply_settings(self):
+        plugin.set_default_lane(plugin.LANE_BACKGROUND)
+        plugin.set_bandwidth_limit(plugin.get_setting_int('service_bandwidth', 512))
+
+    def busy(self):
+        """True when background work should stop: shutdown, playback or a user at the remote"""
+        if self.abortRequested() or self.player.isPlaying(): return True
+        return xbmc.getGlobalIdleTime() < plugin.get_setting_int('service_idle', 60)
+
+def _first_page_folders(items):
+    # The folders browse() shows (and art-scans) on a category's first page
+    folders = sorted((i for i in items if i['is_folder']), key=lambda i: plugin.natural_key(i['label']))
+    page_size = plugin.get_setting_int('browse_page_size', 200)
+    return folders[:page_size] if page_size > 0 else folders
+
+def refresh(monitor):
+    """One full pass; returns False if it was interrupted"""
+    workers = max(1, plugin.get_setting_int('service_threads', 2))
+    interval = plugin.get_setting_int('service_interval', 30) * 60
+
+    plugin.reload_health()
+    plugin.check_all_hosts()
+    plugin.save_health()
+
+    # Listings that would expire before the next pass are revalidated now
+    max_age = max(0, plugin.get_setting_int('listing_cache_ttl', 60) * 60 - interval)
+    for _, url in plugin.MOVIE_CATEGORIES + plugin.SERIES_CATEGORIES:
+        if monitor.busy(): return False
+        items = plugin.fetch_links(url, max_age=max_age)
+        plugin.resolve_folder_art(_first_page_folders(items), interval, workers,
+                                  on_progress=lambda done, total: not monitor.busy())
+    plugin.save_health()
+
+    if plugin.get_setting_bool('service_catalog', True):
+        refresh_after = plugin.get_setting_int('catalog_refresh', 6) * 3600
+        for type_key in ('movies', 'series'):
+            # Only an index the user built is kept up to date; crawls are
+            # incremental and resume where an interrupted one stopped
+            built_at, pending = plugin.catalog_status(type_key)
+            if built_at is None and not pending: continue
+            if not pending and time.time() - built_at < refresh_after: continue
+            if monitor.busy(): return False
+            result = plugin.crawl_catalog(type_key, lambda folders, files: not monitor.busy(), workers)
+            plugin.save_health()
+            if result is None: return False
+    return True
+
+def run():
+    monitor = DhakaFlixService()
+    downloads.reset_active()
+    monitor.start_downloads()
+    next_run = time.time() + STARTUP_DELAY
+    while not monitor.waitForAbort(POLL_INTERVAL):
+        # Picks up downloads queued while the last queue run was finishing
+        monitor.start_downloads()
+        if not plugin.get_setting_bool('service_enabled', True): continue
+        if time.time() < next_run or monitor.busy(): continue
+        try:
+            done = refresh(monitor)
+        except Exception as e:
+            xbmc.log(f"DhakaFlix service: refresh failed: {e}", xbmc.LOGWARNING)
+            done = False
+        if done:
+            next_run = time.time() + plugin.get_setting_int('service_interval', 30) * 60
+        else:
+            next_run = time.time() + RETRY_DELAY
+    # Running downloads save their progress and stop on abort
+    if monitor.downloader: monitor.downloader.join(5)
+    plugin.save_health()